@@ -20,6 +20,10 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Faster JSON serialization for API responses
+    from app.json_provider import init_json_provider
+    init_json_provider(app)
+    
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
@@ -55,6 +59,13 @@ def create_app(config_class=Config):
     def health_check():
         return {'status': 'healthy', 'service': 'liber-sommelier-ai'}
     
+    # Warm up the AI services in the background so worker startup isn't delayed
+    if app.config.get('PREWARM_SERVICES'):
+        from app.services.ai_agent import prewarm_ai_services
+        from app.services.background_tasks import submit_task
+        with app.app_context():
+            submit_task(prewarm_ai_services)
+    
     # Note: Label images are now served directly from Supabase Storage (public bucket)
     # QR codes are served via signed URLs through the venues API endpoints
     
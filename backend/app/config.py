@@ -101,9 +101,16 @@ class Config:
             f"{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
         )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # One pooled connection per request thread plus one per background task
+    # thread (app/services/background_tasks.py): chat threads hold theirs through
+    # the OpenAI call and SSE streams for the whole stream, so a smaller pool makes
+    # threads wait up to pool_timeout under load. Per process; the database sees
+    # GUNICORN_WORKERS times (pool_size + max_overflow) connections at most
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_recycle': 300,
-        'pool_pre_ping': True
+        'pool_pre_ping': True,
+        'pool_size': int(os.getenv('GUNICORN_THREADS', '12')) + int(os.getenv('BACKGROUND_TASK_WORKERS', '4')),
+        'max_overflow': 4
     }
     
     # JWT
@@ -120,8 +127,21 @@ class Config:
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-5-mini-2025-08-07')  # Conversational model for opening messages (use gpt-4o-mini as default, can be overridden with gpt-5 if available)
     OPENAI_FINETUNED_MODEL = os.getenv('OPENAI_FINETUNED_MODEL', 'ft:gpt-4.1-mini-2025-04-14:personal:liber-ai:CoTKB8PZ')  # Fine-tuned model for wine selection (from .env)
+    # Optional OpenAI-compatible server for the selector (e.g. a self-hosted vLLM
+    # endpoint, http://vllm:8000/v1); unset = OpenAI. The key defaults to OPENAI_API_KEY.
+    OPENAI_FINETUNED_BASE_URL = os.getenv('OPENAI_FINETUNED_BASE_URL') or None
+    OPENAI_FINETUNED_API_KEY = os.getenv('OPENAI_FINETUNED_API_KEY', '')
     OPENAI_COMMUNICATION_MODEL = os.getenv('OPENAI_COMMUNICATION_MODEL', 'gpt-5-mini-2025-08-07')  # Model for natural language communication
     OPENAI_EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
+    # Single label recommendations: the fine-tuned selector also writes the guest message
+    # (one OpenAI call instead of two). Off until validated against the fine-tuned model.
+    B2C_SINGLE_CALL_RECOMMENDATIONS = os.getenv('B2C_SINGLE_CALL_RECOMMENDATIONS', 'false').lower() == 'true'
+    # Journey recommendations: pass the selector only the N wines closest to the dishes
+    # (Qdrant search) instead of the whole catalog. 0 = off, needs an indexed collection.
+    B2C_JOURNEY_CANDIDATES = int(os.getenv('B2C_JOURNEY_CANDIDATES', '0'))
+    # Create the AI services and open their connections when a worker starts,
+    # instead of on the first chat request
+    PREWARM_SERVICES = os.getenv('PREWARM_SERVICES', 'false').lower() == 'true'
     
     # Frontend
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173')
@@ -135,6 +155,9 @@ class Config:
     # Session settings
     SESSION_TIMEOUT_MINUTES = int(os.getenv('SESSION_TIMEOUT_MINUTES', '60'))
     MAX_CONVERSATION_HISTORY = int(os.getenv('MAX_CONVERSATION_HISTORY', '20'))
+    # B2C prompts already carry dishes, guests and preferences in the system prompt,
+    # so only the latest turns are sent verbatim
+    B2C_PROMPT_HISTORY = int(os.getenv('B2C_PROMPT_HISTORY', '6'))
 
 
 class ProductionConfig(Config):
@@ -151,4 +174,5 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # SQLite's in-memory pool takes no pool sizing
 
@@ -0,0 +1,39 @@
+"""
+JSON Provider for LIBER
+Serializes API responses with orjson (much faster than stdlib json on large payloads)
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speedup, Flask's stdlib provider is used without it
+    orjson = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson.
+    Output matches the default provider: sorted keys, compact unless debugging,
+    and non-native types (datetime, Decimal, ...) converted by Flask's default().
+    """
+
+    # Datetimes go through default() so they keep Flask's HTTP date format
+    options = (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if orjson else 0
+    )
+
+    def dumps(self, obj, **kwargs) -> str:
+        option = self.options
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def init_json_provider(app):
+    """Use the orjson provider for the app if orjson is installed."""
+    if orjson is not None:
+        app.json = ORJSONProvider(app)
@@ -114,6 +114,36 @@ class Product(db.Model):
         
         return data
     
+    @staticmethod
+    def to_list_dict(row, optional_fields=()):
+        """
+        Convert a catalog query row (not an ORM instance) to a dictionary.
+        Used by the catalog listing, which selects plain columns to skip ORM loading.
+        
+        Args:
+            row: Row with id, venue_id, name, type, price, is_available
+            optional_fields: Names of the optional columns selected in the row
+            
+        Returns:
+            Dict with the same shape as to_dict()
+        """
+        data = {
+            'id': row.id,
+            'venue_id': row.venue_id,
+            'name': row.name,
+            'type': row.type,
+            'price': float(row.price) if row.price else None,
+            'is_available': row.is_available
+        }
+        
+        # Add optional fields only if set
+        for field in optional_fields:
+            value = getattr(row, field)
+            if value:
+                data[field] = value
+        
+        return data
+    
     def calculate_margin(self):
         """Calculate margin from price and cost_price"""
         if self.price and self.cost_price:
@@ -170,5 +200,10 @@ db.Index('idx_products_venue_id', Product.venue_id)
 db.Index('idx_products_type', Product.type)
 db.Index('idx_products_is_available', Product.is_available)
 db.Index('idx_products_price', Product.price)
-db.Index('idx_products_venue_type', Product.venue_id, Product.type)
+db.Index('idx_products_venue_type_name', Product.venue_id, Product.type, Product.name)
+# Covering index for the recommendation catalog (index-only scan, no sort). It also
+# serves the available-only catalog reads that used idx_products_venue_available
+db.Index('idx_products_venue_available_type_name', Product.venue_id, Product.type, Product.name,
+         postgresql_include=['id', 'price', 'image_url'],
+         postgresql_where=Product.is_available == True)  # noqa: E712
 
@@ -3,7 +3,9 @@ Session Model - Represents a chat session
 """
 from datetime import datetime
 import uuid
+from sqlalchemy import select
 from app import db
+from app.models.message import Message
 
 
 class Session(db.Model):
@@ -144,15 +146,28 @@ class Session(db.Model):
         self.ended_at = datetime.utcnow()
     
     def get_conversation_history(self, limit=None):
-        """Get conversation messages for AI context"""
-        query = self.messages.order_by(db.asc(db.text('created_at')))
+        """
+        Get conversation messages for AI context.
+        
+        Reads only role and content with a single query (no Message instances),
+        served by idx_messages_session_created.
+        
+        Args:
+            limit: Keep only the most recent `limit` messages
+            
+        Returns:
+            List of {'role', 'content'} dicts, oldest first
+        """
+        query = select(Message.role, Message.content).where(Message.session_id == self.id)
         if limit:
-            query = query.limit(limit)
+            rows = db.session.execute(
+                query.order_by(Message.created_at.desc()).limit(limit)
+            ).all()
+            rows.reverse()
+        else:
+            rows = db.session.execute(query.order_by(Message.created_at)).all()
         
-        return [
-            {'role': msg.role, 'content': msg.content}
-            for msg in query.all()
-        ]
+        return [{'role': role, 'content': content} for role, content in rows]
     
     def extract_budget_from_context(self):
         """Extract budget_initial from context and save it"""
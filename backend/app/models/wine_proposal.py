@@ -35,7 +35,9 @@ class WineProposal(db.Model):
     
     # Relationships
     session = db.relationship('Session', backref='wine_proposals')
-    product = db.relationship('Product', backref='proposals')
+    # Proposals are removed by the ON DELETE CASCADE foreign key, so the ORM
+    # must not load them to null out product_id when a product is deleted
+    product = db.relationship('Product', backref=db.backref('proposals', passive_deletes=True))
     message = db.relationship('Message', backref='wine_proposals')
     
     def __repr__(self):
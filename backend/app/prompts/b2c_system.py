@@ -356,8 +356,11 @@ def get_finetuned_selection_prompt(
     if not isinstance(featured_wines, list):
         featured_wines = []
     
-    # Build wine list context
-    wines_context = _build_wines_list_for_finetuned(all_wines)
+    # Build wine list context (catalogs from AIAgentService cache their rendering)
+    if hasattr(all_wines, 'prompt_block'):
+        wines_context = all_wines.prompt_block('finetuned', _build_wines_list_for_finetuned)
+    else:
+        wines_context = _build_wines_list_for_finetuned(all_wines)
     
     # Build featured wines context for prompt
     featured_wines_context = ""
@@ -642,14 +645,7 @@ def get_communication_prompt(
     Returns:
         System prompt for communication model
     """
-    style_intros = {
-        'professional': f"Sei il sommelier di {venue_name}. Sei elegante e competente, sai raccontare il vino con passione.",
-        'friendly': f"Sei il sommelier di {venue_name}. Sei caloroso, informale e ami condividere la tua passione per il vino.",
-        'expert': f"Sei il sommelier di {venue_name}. Sei un esperto che sa rendere accessibile anche il vino più complesso.",
-        'playful': f"Sei il sommelier di {venue_name}. Sei creativo e ami sorprendere, rendendo ogni scelta un piccolo racconto."
-    }
-    
-    intro = style_intros.get(sommelier_style, style_intros['professional'])
+    intro = _sommelier_intro(venue_name, sommelier_style)
     
     # Build wine selection context
     selection_text = ""
@@ -714,6 +710,45 @@ Rispondi in italiano. SOLO testo, niente formattazione markdown."""
     return prompt
 
 
+def get_single_call_message_instructions(venue_name: str, sommelier_style: str) -> str:
+    """
+    Extra instructions for the fine-tuned selection prompt when the selector
+    also writes the guest message (single label mode, one API call instead of
+    selection + communication model).
+    
+    Args:
+        venue_name: Name of the venue
+        sommelier_style: Style of sommelier
+        
+    Returns:
+        Text to append to the selection system prompt
+    """
+    intro = _sommelier_intro(venue_name, sommelier_style)
+    
+    return f"""## MESSAGGIO PER IL CLIENTE
+
+Oltre alla selezione, aggiungi al JSON il campo "message" (stringa): il messaggio da mostrare al cliente.
+
+{intro}
+
+- SII BREVE: 50-80 parole totali massimo
+- Menziona solo i primi 3 vini (best=true e i successivi 2), con i nomi ESATTI della selezione
+- Per ogni vino usa direttamente il suo "reason" in una frase, senza espanderlo
+- Formato: "Il mio consiglio: [Nome Vino] - [breve motivo]. Un'alternativa: [Nome Vino] - [breve motivo]. [Nome Vino] - [breve motivo]."
+- In italiano, SOLO testo, niente formattazione markdown"""
+
+
+def _sommelier_intro(venue_name: str, sommelier_style: str) -> str:
+    """Opening line describing the sommelier persona for the given style."""
+    style_intros = {
+        'professional': f"Sei il sommelier di {venue_name}. Sei elegante e competente, sai raccontare il vino con passione.",
+        'friendly': f"Sei il sommelier di {venue_name}. Sei caloroso, informale e ami condividere la tua passione per il vino.",
+        'expert': f"Sei il sommelier di {venue_name}. Sei un esperto che sa rendere accessibile anche il vino più complesso.",
+        'playful': f"Sei il sommelier di {venue_name}. Sei creativo e ami sorprendere, rendendo ogni scelta un piccolo racconto."
+    }
+    return style_intros.get(sommelier_style, style_intros['professional'])
+
+
 def _build_wines_list_for_finetuned(wines: List[Dict]) -> str:
     """Build wine list context for fine-tuned model prompt."""
     if not wines:
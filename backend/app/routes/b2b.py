@@ -7,7 +7,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import func
 from app import db
 from app.models import User, Venue, Session, Message, Product
-from app.services.ai_agent import AIAgentService
+from app.services.ai_agent import get_ai_agent
 from app.services.conversation_manager import ConversationManager
 
 b2b_bp = Blueprint('b2b', __name__)
@@ -54,7 +54,7 @@ def send_b2b_message():
     
     try:
         # Get AI response
-        ai_agent = AIAgentService()
+        ai_agent = get_ai_agent()
         response = ai_agent.process_b2b_message(
             session=session,
             venue=venue,
@@ -4,10 +4,10 @@ Chat Routes for LIBER (B2C Customer Chat)
 from datetime import datetime, timedelta
 import uuid
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from app import db
 from app.models import Venue, Session, Message, WineProposal, Product
-from app.services.ai_agent import AIAgentService
+from app.services.ai_agent import get_ai_agent
 from app.services.conversation_manager import ConversationManager
 
 logger = logging.getLogger(__name__)
@@ -15,6 +15,159 @@ logger = logging.getLogger(__name__)
 chat_bp = Blueprint('chat', __name__)
 
 
+def _load_products_by_id(product_ids):
+    """
+    Load the proposed products with a single IN query.
+    
+    Args:
+        product_ids: Product IDs from the AI response (falsy values are skipped)
+        
+    Returns:
+        Dict mapping str(product_id) to Product, so int and str IDs both match
+    """
+    ids = {str(product_id) for product_id in product_ids if product_id}
+    if not ids:
+        return {}
+    products = Product.query.filter(Product.id.in_([int(i) for i in ids if i.isdigit()])).all()
+    return {str(product.id): product for product in products}
+
+
+def _complete_b2c_turn(session, conversation_manager, response):
+    """
+    Save the AI response of a B2C turn and build the API payload.
+    
+    Args:
+        session: The chat session
+        conversation_manager: ConversationManager used for the turn
+        response: Result of AIAgentService.process_b2c_message
+        
+    Returns:
+        Dict returned to the client (message, message_id, wines, journeys, ...)
+    """
+    # Log response structure for debugging
+    logging.info(f"AI Agent response received: type={type(response)}, keys={list(response.keys()) if isinstance(response, dict) else 'not a dict'}")
+    logging.info(f"AI Agent response: has_message={bool(response.get('message'))}, message_type={type(response.get('message'))}, message_length={len(str(response.get('message', '')))}, is_opening={response.get('metadata', {}).get('is_opening', False)}, wines_count={len(response.get('wines', []))}, journeys_count={len(response.get('journeys', []))}")
+    
+    # Ensure message is always a string - handle None, empty, or non-string values
+    raw_message = response.get('message')
+    if raw_message is None:
+        logging.warning("Response message is None")
+        message_content = ''
+    elif not isinstance(raw_message, str):
+        logging.warning(f"Response message is not a string: type={type(raw_message)}, value={repr(raw_message)}")
+        message_content = str(raw_message) if raw_message else ''
+    else:
+        message_content = raw_message
+    
+    logging.info(f"Extracted message_content: type={type(message_content)}, length={len(message_content)}, is_empty={not message_content or not message_content.strip()}, preview={message_content[:100] if message_content else 'empty'}")
+    if not message_content:
+        # Generate fallback message if empty
+        is_opening = response.get('metadata', {}).get('is_opening', False)
+        
+        if is_opening:
+            # Opening message fallback - should not mention recommendations
+            message_content = "Benvenuti! Sono qui per aiutarvi a scegliere il vino perfetto per la vostra serata. Avete esigenze particolari o preferenze da comunicarmi?"
+        elif response.get('wines'):
+            wines = response.get('wines', [])
+            best_wine = next((w for w in wines if w.get('best')), wines[0] if wines else None)
+            if best_wine:
+                message_content = f"Ecco il mio consiglio: {best_wine.get('name', 'Vino')} - €{best_wine.get('price', 'N/D')}"
+            else:
+                message_content = "Ecco le mie raccomandazioni per voi."
+        elif response.get('journeys'):
+            message_content = "Ecco i percorsi di degustazione che ho preparato per voi."
+        else:
+            message_content = "Ecco le mie raccomandazioni per voi."
+    
+    # Save assistant message
+    assistant_message = conversation_manager.add_message(
+        session=session,
+        role='assistant',
+        content=message_content,
+        metadata=response.get('metadata'),
+        products=response.get('wine_ids')
+    )
+    
+    # Track wine proposals for analytics (if AI recommended wines)
+    # Check is_recommending from metadata or directly, and ensure we have wines/journeys
+    is_recommending = response.get('metadata', {}).get('is_recommending', False) or response.get('is_recommending', False)
+    has_wines = response.get('wines') and len(response.get('wines', [])) > 0
+    has_journeys = response.get('journeys') and len(response.get('journeys', [])) > 0
+    has_wine_ids = response.get('wine_ids') and len(response.get('wine_ids', [])) > 0
+    
+    if is_recommending and (has_wines or has_journeys or has_wine_ids):
+        track_wine_proposals(session.id, assistant_message.id, response)
+    
+    # Update session activity
+    session.update_activity()
+    db.session.commit()
+    
+    return {
+        'message': message_content,
+        'message_id': assistant_message.id,  # Include message ID for fetching rankings
+        'wines': response.get('wines', []),
+        'all_rankings': response.get('all_rankings', []),  # Include all rankings
+        'journeys': response.get('journeys', []),
+        'suggestions': response.get('suggestions', []),
+        'mode': response.get('mode', 'single'),
+        'metadata': response.get('metadata', {})
+    }
+
+
+def _sse_event(event, data):
+    """Format a server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
+
+
+def _stream_b2c_turn(session, venue, message_content, conversation_manager):
+    """
+    Stream a B2C turn as server-sent events.
+    
+    Sends 'delta' events ({"delta": text}) while the opening message is generated,
+    then a 'done' event with the same payload the JSON endpoint returns, or an
+    'error' event ({"message": ...}).
+    """
+    def generate():
+        try:
+            response = None
+            for event in get_ai_agent().stream_b2c_message(
+                session=session,
+                venue=venue,
+                user_message=message_content,
+                context=session.context
+            ):
+                if 'delta' in event:
+                    yield _sse_event('delta', {'delta': event['delta']})
+                else:
+                    response = event['result']
+            
+            yield _sse_event('done', _complete_b2c_turn(session, conversation_manager, response))
+        except ValueError as e:
+            db.session.rollback()
+            yield _sse_event('error', {'message': str(e)})
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Unexpected error in streamed send_message: {e}", exc_info=True)
+            yield _sse_event('error', {
+                'message': 'Si è verificato un errore imprevisto. Riprova tra qualche secondo.'
+            })
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Keep proxies from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _response_cache_headers(response):
+    """X-Cache header for AI responses that went through the response cache."""
+    cache_hit = response.get('metadata', {}).get('cache_hit')
+    if cache_hit is None:
+        return {}
+    return {'X-Cache': 'HIT' if cache_hit else 'MISS'}
+
+
 def track_wine_proposals(session_id, message_id, response_data):
     """
     Track wine proposals in WineProposal table for analytics.
@@ -34,6 +187,9 @@ def track_wine_proposals(session_id, message_id, response_data):
         if mode == 'journey':
             # Handle journey mode
             journeys = response_data.get('journeys', [])
+            products_by_id = _load_products_by_id(
+                wine.get('id') for journey in journeys for wine in journey.get('wines', [])
+            )
             for journey_idx, journey in enumerate(journeys):
                 journey_id = journey.get('id', journey_idx)
                 wines = journey.get('wines', [])
@@ -43,7 +199,7 @@ def track_wine_proposals(session_id, message_id, response_data):
                     if not product_id:
                         continue
                     
-                    product = Product.query.get(product_id)
+                    product = products_by_id.get(str(product_id))
                     if not product:
                         continue
                     
@@ -72,12 +228,13 @@ def track_wine_proposals(session_id, message_id, response_data):
             
             # Use all_rankings if available (has ALL wines with rank, reason, best)
             if all_rankings:
+                products_by_id = _load_products_by_id(wine.get('id') for wine in all_rankings)
                 for wine in all_rankings:
                     product_id = wine.get('id')
                     if not product_id:
                         continue
                     
-                    product = Product.query.get(product_id)
+                    product = products_by_id.get(str(product_id))
                     if not product:
                         continue
                     
@@ -103,12 +260,13 @@ def track_wine_proposals(session_id, message_id, response_data):
                     rank_counter += 1
             # Fallback: use wines list if available (has full data)
             elif wines_to_return:
+                products_by_id = _load_products_by_id(wine.get('id') for wine in wines_to_return)
                 for wine in wines_to_return:
                     product_id = wine.get('id')
                     if not product_id:
                         continue
                     
-                    product = Product.query.get(product_id)
+                    product = products_by_id.get(str(product_id))
                     if not product:
                         continue
                     
@@ -134,8 +292,9 @@ def track_wine_proposals(session_id, message_id, response_data):
                     rank_counter += 1
             # Last fallback: use wine_ids if wines list not available
             elif wine_ids:
+                products_by_id = _load_products_by_id(wine_ids)
                 for product_id in wine_ids:
-                    product = Product.query.get(product_id)
+                    product = products_by_id.get(str(product_id))
                     if not product:
                         continue
                     
@@ -347,7 +506,8 @@ def send_message():
             "guest_count": 4,
             "budget": "media",  // "base" | "media" | "nessuna"
             "wine_count": 2     // 1 = single wine, 2+ = tasting journey
-        }
+        },
+        "stream": true  // Optional: answer with server-sent events (see _stream_b2c_turn)
     }
     """
     data = request.get_json()
@@ -414,8 +574,11 @@ def send_message():
     db.session.refresh(session)
     
     # Process message through AI agent
+    if data.get('stream'):
+        return _stream_b2c_turn(session, venue, message_content, conversation_manager)
+    
     try:
-        ai_agent = AIAgentService()
+        ai_agent = get_ai_agent()
         response = ai_agent.process_b2c_message(
             session=session,
             venue=venue,
@@ -423,75 +586,7 @@ def send_message():
             context=session.context  # Pass context with dishes and guest_count
         )
         
-        # Log response structure for debugging
-        import logging
-        logging.info(f"AI Agent response received: type={type(response)}, keys={list(response.keys()) if isinstance(response, dict) else 'not a dict'}")
-        logging.info(f"AI Agent response: has_message={bool(response.get('message'))}, message_type={type(response.get('message'))}, message_length={len(str(response.get('message', '')))}, is_opening={response.get('metadata', {}).get('is_opening', False)}, wines_count={len(response.get('wines', []))}, journeys_count={len(response.get('journeys', []))}")
-        
-        # Ensure message is always a string - handle None, empty, or non-string values
-        raw_message = response.get('message')
-        if raw_message is None:
-            logging.warning("Response message is None")
-            message_content = ''
-        elif not isinstance(raw_message, str):
-            logging.warning(f"Response message is not a string: type={type(raw_message)}, value={repr(raw_message)}")
-            message_content = str(raw_message) if raw_message else ''
-        else:
-            message_content = raw_message
-        
-        logging.info(f"Extracted message_content: type={type(message_content)}, length={len(message_content)}, is_empty={not message_content or not message_content.strip()}, preview={message_content[:100] if message_content else 'empty'}")
-        if not message_content:
-            # Generate fallback message if empty
-            is_opening = response.get('metadata', {}).get('is_opening', False)
-            
-            if is_opening:
-                # Opening message fallback - should not mention recommendations
-                message_content = "Benvenuti! Sono qui per aiutarvi a scegliere il vino perfetto per la vostra serata. Avete esigenze particolari o preferenze da comunicarmi?"
-            elif response.get('wines'):
-                wines = response.get('wines', [])
-                best_wine = next((w for w in wines if w.get('best')), wines[0] if wines else None)
-                if best_wine:
-                    message_content = f"Ecco il mio consiglio: {best_wine.get('name', 'Vino')} - €{best_wine.get('price', 'N/D')}"
-                else:
-                    message_content = "Ecco le mie raccomandazioni per voi."
-            elif response.get('journeys'):
-                message_content = "Ecco i percorsi di degustazione che ho preparato per voi."
-            else:
-                message_content = "Ecco le mie raccomandazioni per voi."
-        
-        # Save assistant message
-        assistant_message = conversation_manager.add_message(
-            session=session,
-            role='assistant',
-            content=message_content,
-            metadata=response.get('metadata'),
-            products=response.get('wine_ids')
-        )
-        
-        # Track wine proposals for analytics (if AI recommended wines)
-        # Check is_recommending from metadata or directly, and ensure we have wines/journeys
-        is_recommending = response.get('metadata', {}).get('is_recommending', False) or response.get('is_recommending', False)
-        has_wines = response.get('wines') and len(response.get('wines', [])) > 0
-        has_journeys = response.get('journeys') and len(response.get('journeys', [])) > 0
-        has_wine_ids = response.get('wine_ids') and len(response.get('wine_ids', [])) > 0
-        
-        if is_recommending and (has_wines or has_journeys or has_wine_ids):
-            track_wine_proposals(session.id, assistant_message.id, response)
-        
-        # Update session activity
-        session.update_activity()
-        db.session.commit()
-        
-        return jsonify({
-            'message': message_content,
-            'message_id': assistant_message.id,  # Include message ID for fetching rankings
-            'wines': response.get('wines', []),
-            'all_rankings': response.get('all_rankings', []),  # Include all rankings
-            'journeys': response.get('journeys', []),
-            'suggestions': response.get('suggestions', []),
-            'mode': response.get('mode', 'single'),
-            'metadata': response.get('metadata', {})
-        }), 200
+        return jsonify(_complete_b2c_turn(session, conversation_manager, response)), 200, _response_cache_headers(response)
         
     except ValueError as e:
         # Configuration or expected errors from AI agent
@@ -4,21 +4,284 @@ Product Routes for LIBER Sommelier AI
 import logging
 import csv
 import io
+import itertools
 import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
 from werkzeug.utils import secure_filename
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import case, column, inspect, literal_column, table, update
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models import Product, User, Venue
-from app.services.vector_search import VectorSearchService
-from app.services.wine_parser import WineParserService
-from app.services.wine_description_generator import WineDescriptionGenerator
+from app.services.background_tasks import submit_task
 
 logger = logging.getLogger(__name__)
 
 products_bp = Blueprint('products', __name__)
 
 
+def _index_product_task(product_id):
+    """Index a product in the vector database (runs as a background task)."""
+    from app.services.vector_search import get_vector_service
+    
+    product = Product.query.get(product_id)
+    if product:
+        get_vector_service().index_product(product)
+
+
+# Rows inserted and committed together by bulk_import
+_BULK_IMPORT_CHUNK_SIZE = 500
+
+# Products loaded and indexed together by sync_vectors
+_SYNC_VECTORS_BATCH_SIZE = 100
+
+# Above this many rows bulk_import loads products with COPY instead of INSERT
+_BULK_IMPORT_COPY_THRESHOLD = 500
+
+# Escapes for values in COPY text format
+_COPY_ESCAPE_TABLE = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_value(value):
+    """Format a value for COPY text format (\\N is NULL)."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).translate(_COPY_ESCAPE_TABLE)
+
+
+def _copy_products(mappings):
+    """
+    Load product rows with a single COPY ... FROM STDIN in the session transaction.
+    
+    Args:
+        mappings: Insert mappings, all with the same keys
+        
+    Returns:
+        Number of copied rows
+    """
+    columns = list(mappings[0])
+    buffer = io.StringIO()
+    for mapping in mappings:
+        buffer.write('\t'.join(_copy_value(mapping[c]) for c in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+    
+    dbapi_connection = db.session.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY products ({', '.join(columns)}) FROM STDIN", buffer)
+    return len(mappings)
+
+
+# Optional product fields that are mapped on the Product model (computed once,
+# instead of calling hasattr(Product, ...) for every field of every row)
+_MAPPED_PRODUCT_FIELDS = frozenset(
+    f for f in (
+        'region', 'grape_variety', 'vintage', 'producer', 'description',
+        'cost_price', 'image_url', 'color', 'aromas', 'body',
+        'acidity_level', 'tannin_level'
+    )
+    if hasattr(Product, f)
+)
+
+# Optional columns that exist in the products table of some databases
+# but are not mapped on the Product model
+_OPTIONAL_PRODUCT_COLUMNS = ('region', 'grape_variety', 'vintage', 'description')
+_product_columns = None
+
+
+def _get_product_columns():
+    """Return the set of column names of the products table (inspected once per process)."""
+    global _product_columns
+    if _product_columns is None:
+        _product_columns = {c['name'] for c in inspect(db.engine).get_columns('products')}
+    return _product_columns
+
+
+# Removes currency symbols and normalizes the decimal separator in one pass
+_PRICE_CLEANUP_TABLE = str.maketrans({'€': None, '$': None, ',': '.'})
+
+
+# In-process cache of the public catalog listing (LRU), keyed by venue_identifier
+# and the parsed filters. Each gunicorn worker keeps its own copy and only sees
+# its own invalidations, so the TTL bounds staleness across workers.
+_PRODUCTS_CACHE_TTL = 60  # seconds
+_PRODUCTS_CACHE_MAX_ENTRIES = 512
+_products_cache = OrderedDict()
+_products_cache_lock = threading.Lock()
+
+
+def _get_cached_products(key):
+    """Return the cached (venue_id, is_public, json_body) entry for key, if fresh."""
+    with _products_cache_lock:
+        entry = _products_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del _products_cache[key]
+            return None
+        _products_cache.move_to_end(key)
+        return value
+
+
+def _set_cached_products(key, value):
+    """Cache a (venue_id, is_public, json_body) entry, evicting the least recently used."""
+    with _products_cache_lock:
+        _products_cache[key] = (time.monotonic() + _PRODUCTS_CACHE_TTL, value)
+        _products_cache.move_to_end(key)
+        if len(_products_cache) > _PRODUCTS_CACHE_MAX_ENTRIES:
+            _products_cache.popitem(last=False)
+
+
+def _invalidate_products_cache(venue_id):
+    """Drop every cached catalog listing of a venue after its products change."""
+    with _products_cache_lock:
+        stale_keys = [k for k, (_, value) in _products_cache.items() if value[0] == venue_id]
+        for key in stale_keys:
+            del _products_cache[key]
+
+
+def _encode_products(result):
+    """Encode the catalog listing once, so cache hits are served without re-encoding."""
+    return current_app.json.dumps(result).encode('utf-8')
+
+
+def _products_response(body, is_public):
+    """Build the catalog listing response, cacheable by browsers/CDN when public."""
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    if is_public:
+        response.headers['Cache-Control'] = 'public, max-age=60'
+    return response, 200
+
+
+def _parse_price(price_str):
+    """
+    Parse a price cell from a CSV upload (e.g. "€ 12,50").
+    
+    Returns:
+        Positive float, or None if the value is not a valid price
+    """
+    try:
+        price = float(price_str.translate(_PRICE_CLEANUP_TABLE))
+    except (ValueError, AttributeError):
+        return None
+    return price if price > 0 else None
+
+
+# Max label image size (5MB)
+_MAX_LABEL_IMAGE_SIZE = 5 * 1024 * 1024
+
+# Label image extensions accepted by upload_label_image and their content types
+_LABEL_CONTENT_TYPES = MappingProxyType({
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp'
+})
+
+# Label uploads that failed in this worker (file name -> product ID), reported
+# once by image-status. Bounded: failures nobody polls for are evicted oldest first
+_FAILED_LABEL_UPLOADS_MAX_ENTRIES = 1000
+_failed_label_uploads = OrderedDict()
+_failed_label_uploads_lock = threading.Lock()
+
+
+def _record_failed_label_upload(product_id, filename):
+    """Remember a failed label upload until image-status reports it."""
+    with _failed_label_uploads_lock:
+        _failed_label_uploads[filename] = product_id
+        if len(_failed_label_uploads) > _FAILED_LABEL_UPLOADS_MAX_ENTRIES:
+            _failed_label_uploads.popitem(last=False)
+
+
+def _pop_failed_label_upload(filename):
+    """Return True (and forget it) if the label upload of filename failed."""
+    with _failed_label_uploads_lock:
+        return _failed_label_uploads.pop(filename, None) is not None
+
+
+def _forget_failed_label_uploads(product_id):
+    """Drop the failed label uploads of a deleted product."""
+    with _failed_label_uploads_lock:
+        stale = [f for f, pid in _failed_label_uploads.items() if pid == product_id]
+        for filename in stale:
+            del _failed_label_uploads[filename]
+
+
+def _upload_label_image_task(product_id, tmp_path, bucket, filename, content_type):
+    """Upload a spooled label image and save its URL on the product (background task)."""
+    from app.services.supabase_storage import get_storage_service
+    
+    try:
+        storage_service = get_storage_service()
+        with open(tmp_path, 'rb') as stream:
+            public_url = storage_service.upload_stream(
+                bucket=bucket,
+                file_path=filename,
+                stream=stream,
+                content_type=content_type,
+                upsert=True
+            )
+        
+        if not public_url:
+            logger.error(f"Failed to upload label image to Supabase Storage for product {product_id}")
+            _record_failed_label_upload(product_id, filename)
+            return
+        
+        db.session.execute(
+            update(Product).where(Product.id == product_id).values(image_url=public_url)
+        )
+        db.session.commit()
+        logger.info(f"Label image uploaded to Supabase Storage for product {product_id}: {public_url}")
+    except Exception:
+        _record_failed_label_upload(product_id, filename)
+        raise
+    finally:
+        os.remove(tmp_path)
+
+# Unique suffix for uploaded file names: random per process, then a counter,
+# so no random bytes are drawn per upload (uniqueness only, not a secret)
+_UPLOAD_SUFFIX_PREFIX = os.urandom(4).hex()
+_upload_suffix_counter = itertools.count()
+
+
+def _unique_upload_suffix():
+    """Return a file name suffix unique across processes and uploads."""
+    return f"{os.getpid():x}{_UPLOAD_SUFFIX_PREFIX}{next(_upload_suffix_counter):06x}"
+
+
+# Wine types accepted by the CSV import
+_VALID_WINE_TYPES = frozenset({'red', 'white', 'rose', 'sparkling', 'dessert', 'fortified'})
+_VALID_WINE_TYPES_LABEL = 'red, white, rose, sparkling, dessert, fortified'
+
+# Reasonable range for a wine vintage
+_MIN_VINTAGE = 1900
+_MAX_VINTAGE = 2100
+
+
+def _parse_vintage(vintage_str):
+    """
+    Parse a vintage cell from a CSV upload.
+    
+    Returns:
+        Year as int, or None if empty, not a number or out of range
+    """
+    # A 4-digit check rejects most invalid cells without raising an exception
+    if not vintage_str or len(vintage_str) != 4 or not vintage_str.isdecimal():
+        return None
+    year = int(vintage_str)
+    return year if _MIN_VINTAGE <= year <= _MAX_VINTAGE else None
+
+
 # ===========================================
 # VENUE-SPECIFIC ROUTES (must be before generic /venue/<venue_identifier>)
 # ===========================================
@@ -45,42 +308,90 @@ def bulk_import(venue_id):
         logger.warning(f"Empty products list for venue {venue_id}")
         return jsonify({'message': 'Nessun prodotto da importare'}), 400
     
-    created_count = 0
     errors = []
     
+    # Optional fields are only written if they are mapped on the model
+    optional_fields = [
+        f for f in ('region', 'grape_variety', 'vintage', 'description')
+        if f in _MAPPED_PRODUCT_FIELDS
+    ]
+    
+    # First pass: validate rows and build insert mappings (same keys for every row)
+    rows = []
     for idx, p_data in enumerate(products_data):
+        if not isinstance(p_data, dict) or not p_data.get('name'):
+            errors.append({'index': idx, 'error': 'Nome prodotto mancante'})
+            continue
+        
+        mapping = {
+            'venue_id': venue_id,
+            'name': p_data.get('name'),
+            'type': p_data.get('type', 'red'),
+            'price': p_data.get('price', 0),
+            'is_available': p_data.get('is_available', True)
+        }
+        for field in optional_fields:
+            mapping[field] = p_data.get(field)
+        rows.append((idx, mapping))
+    
+    # Large imports (e.g. a whole parsed wine list) are loaded with COPY,
+    # which is much faster than INSERT; if it fails, use the INSERT path
+    # below, which also reports the invalid rows
+    created_count = 0
+    if len(rows) > _BULK_IMPORT_COPY_THRESHOLD:
         try:
-            logger.debug(f"Creating product {idx}: {p_data.get('name')}")
-            product = Product(
-                venue_id=venue_id,
-                name=p_data.get('name'),
-                type=p_data.get('type', 'red'),
-                price=p_data.get('price', 0),
-                is_available=p_data.get('is_available', True)
-            )
-            
-            # Set optional fields only if they exist
-            if 'region' in p_data and hasattr(Product, 'region'):
-                product.region = p_data.get('region')
-            if 'grape_variety' in p_data and hasattr(Product, 'grape_variety'):
-                product.grape_variety = p_data.get('grape_variety')
-            if 'vintage' in p_data and hasattr(Product, 'vintage'):
-                product.vintage = p_data.get('vintage')
-            if 'description' in p_data and hasattr(Product, 'description'):
-                product.description = p_data.get('description')
-            db.session.add(product)
-            created_count += 1
+            copied_count = _copy_products([mapping for _, mapping in rows])
+            db.session.commit()
+            _invalidate_products_cache(venue_id)
+            created_count = copied_count
+            rows = []
         except Exception as e:
-            logger.error(f"Error creating product {idx} ({p_data.get('name')}): {e}")
-            errors.append({'index': idx, 'error': str(e)})
+            db.session.rollback()
+            logger.warning(f"COPY import failed for venue {venue_id}, falling back to INSERT: {e}")
+    
+    # Second pass: insert valid rows with one multi-row INSERT per chunk,
+    # committing each chunk to keep transactions short
+    insert_stmt = Product.__table__.insert()
+    for start in range(0, len(rows), _BULK_IMPORT_CHUNK_SIZE):
+        chunk = rows[start:start + _BULK_IMPORT_CHUNK_SIZE]
+        try:
+            db.session.execute(insert_stmt, [mapping for _, mapping in chunk])
+            db.session.commit()
+            created_count += len(chunk)
+            _invalidate_products_cache(venue_id)
+        except IntegrityError as e:
+            db.session.rollback()
+            logger.warning(f"Bulk insert failed for venue {venue_id}, retrying chunk row by row: {e}")
+            # Retry row by row (each in a savepoint) to report which rows are invalid
+            chunk_created = 0
+            for idx, mapping in chunk:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert_stmt, mapping)
+                    chunk_created += 1
+                except Exception as row_error:
+                    logger.error(f"Error creating product {idx} ({mapping.get('name')}): {row_error}")
+                    errors.append({'index': idx, 'error': str(row_error)})
+            try:
+                db.session.commit()
+                created_count += chunk_created
+                _invalidate_products_cache(venue_id)
+            except Exception as commit_error:
+                db.session.rollback()
+                logger.error(f"Database commit failed for venue {venue_id}: {commit_error}")
+                return jsonify({
+                    'message': f'Errore database: {str(commit_error)}',
+                    'created': created_count
+                }), 500
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Database commit failed for venue {venue_id}: {e}")
+            return jsonify({
+                'message': f'Errore database: {str(e)}',
+                'created': created_count
+            }), 500
     
-    try:
-        db.session.commit()
-        logger.info(f"Bulk import complete for venue {venue_id}: {created_count} created, {len(errors)} errors")
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"Database commit failed for venue {venue_id}: {e}")
-        return jsonify({'message': f'Errore database: {str(e)}'}), 500
+    logger.info(f"Bulk import complete for venue {venue_id}: {created_count} created, {len(errors)} errors")
     
     return jsonify({
         'message': f'{created_count} prodotti importati',
@@ -99,11 +410,20 @@ def sync_vectors(venue_id):
     if not user or user.venue_id != venue_id:
         return jsonify({'message': 'Non autorizzato'}), 403
     
-    products = Product.query.filter_by(venue_id=venue_id).all()
+    # Stream products with a server-side cursor and index them in batches,
+    # instead of loading the whole catalog in memory first
+    stmt = (
+        db.select(Product)
+        .filter_by(venue_id=venue_id)
+        .execution_options(yield_per=_SYNC_VECTORS_BATCH_SIZE)
+    )
     
     try:
-        vector_service = VectorSearchService()
-        synced_count = vector_service.bulk_index(products)
+        from app.services.vector_search import get_vector_service
+        vector_service = get_vector_service()
+        synced_count = 0
+        for batch in db.session.execute(stmt).scalars().partitions():
+            synced_count += vector_service.bulk_index(list(batch))
         
         return jsonify({
             'message': f'{synced_count} prodotti sincronizzati',
@@ -132,6 +452,7 @@ def parse_wine_list(venue_id):
         return jsonify({'message': 'Testo della carta vini mancante'}), 400
     
     try:
+        from app.services.wine_parser import WineParserService
         parser = WineParserService()
         wines = parser.parse_wine_list(wine_text)
         
@@ -167,6 +488,7 @@ def parse_wine_images(venue_id):
     logger.info(f"Parsing {len(images)} wine list images for venue {venue_id}")
     
     try:
+        from app.services.wine_parser import WineParserService
         parser = WineParserService()
         wines = parser.parse_wine_images(images)
         
@@ -194,9 +516,25 @@ def clear_products(venue_id):
         return jsonify({'message': 'Non autorizzato'}), 403
     
     try:
-        # Delete all products for this venue
-        deleted_count = Product.query.filter_by(venue_id=venue_id).delete()
+        # Delete all products for this venue with a single DELETE; wine proposals
+        # go with them through the ON DELETE CASCADE foreign key
+        result = db.session.execute(
+            Product.__table__.delete()
+            .where(Product.__table__.c.venue_id == venue_id)
+            .returning(Product.__table__.c.id)
+        )
+        deleted_ids = result.scalars().all()
         db.session.commit()
+        _invalidate_products_cache(venue_id)
+        deleted_count = len(deleted_ids)
+        
+        # Remove the deleted products from the vector database in one call
+        if deleted_ids:
+            try:
+                from app.services.vector_search import get_vector_service
+                get_vector_service().delete_products_bulk(deleted_ids)
+            except Exception as e:
+                logger.warning(f"Error deleting products from vector DB: {e}")
         
         return jsonify({
             'message': f'{deleted_count} prodotti eliminati',
@@ -244,8 +582,8 @@ def parse_wine_csv():
         return jsonify({'message': 'Il file deve essere un CSV'}), 400
     
     try:
-        # Read CSV file
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
+        # Read CSV file as a text stream (decoded incrementally, not loaded in memory)
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
         csv_reader = csv.DictReader(stream)
         
         # Required columns
@@ -276,12 +614,22 @@ def parse_wine_csv():
         db_errors = []
         saved_count = 0
         
+        # Resolve the actual (case insensitive) column names once for all rows
+        col_nome = fieldnames_lower.get('nome', 'nome')
+        col_tipo = fieldnames_lower.get('tipo', 'tipo')
+        col_prezzo = fieldnames_lower.get('prezzo', 'prezzo')
+        col_regione = fieldnames_lower.get('regione', 'regione')
+        col_vitigno = fieldnames_lower.get('vitigno', 'vitigno')
+        col_anno = fieldnames_lower.get('anno', 'anno')
+        col_produttore = fieldnames_lower.get('produttore', 'produttore')
+        col_descrizione = fieldnames_lower.get('description', 'description')
+        
         for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 (header is row 1)
             try:
                 # Get values (case insensitive)
-                nome = row.get(fieldnames_lower.get('nome', 'nome'), '').strip()
-                tipo = row.get(fieldnames_lower.get('tipo', 'tipo'), '').strip().lower()
-                prezzo_str = row.get(fieldnames_lower.get('prezzo', 'prezzo'), '').strip()
+                nome = row.get(col_nome, '').strip()
+                tipo = row.get(col_tipo, '').strip().lower()
+                prezzo_str = row.get(col_prezzo, '').strip()
                 
                 # Validate required fields
                 if not nome:
@@ -293,42 +641,28 @@ def parse_wine_csv():
                     continue
                 
                 # Validate wine type
-                valid_types = ['red', 'white', 'rose', 'sparkling', 'dessert', 'fortified']
-                if tipo not in valid_types:
+                if tipo not in _VALID_WINE_TYPES:
                     parsing_errors.append({
                         'row': row_num, 
-                        'error': f'Tipo vino non valido: {tipo}. Valori accettati: {", ".join(valid_types)}'
+                        'error': f'Tipo vino non valido: {tipo}. Valori accettati: {_VALID_WINE_TYPES_LABEL}'
                     })
                     continue
                 
                 # Parse price
-                try:
-                    # Remove currency symbols and spaces
-                    prezzo_clean = prezzo_str.replace('€', '').replace('$', '').replace(',', '.').strip()
-                    prezzo = float(prezzo_clean)
-                    if prezzo <= 0:
-                        raise ValueError('Prezzo deve essere positivo')
-                except (ValueError, AttributeError):
+                prezzo = _parse_price(prezzo_str)
+                if prezzo is None:
                     parsing_errors.append({'row': row_num, 'error': f'Prezzo non valido: {prezzo_str}'})
                     continue
                 
                 # Get optional fields
-                regione = row.get(fieldnames_lower.get('regione', 'regione'), '').strip() or None
-                vitigno = row.get(fieldnames_lower.get('vitigno', 'vitigno'), '').strip() or None
-                anno_str = row.get(fieldnames_lower.get('anno', 'anno'), '').strip() or None
-                produttore = row.get(fieldnames_lower.get('produttore', 'produttore'), '').strip() or None
-                descrizione = row.get(fieldnames_lower.get('description', 'description'), '').strip() or None
+                regione = row.get(col_regione, '').strip() or None
+                vitigno = row.get(col_vitigno, '').strip() or None
+                anno_str = row.get(col_anno, '').strip() or None
+                produttore = row.get(col_produttore, '').strip() or None
+                descrizione = row.get(col_descrizione, '').strip() or None
                 
-                # Parse vintage
-                anno = None
-                if anno_str:
-                    try:
-                        anno = int(anno_str)
-                        # Basic validation for reasonable years
-                        if anno < 1900 or anno > 2100:
-                            anno = None  # Invalid year, ignore
-                    except (ValueError, TypeError):
-                        pass  # Invalid year format, ignore
+                # Parse vintage (invalid years are ignored)
+                anno = _parse_vintage(anno_str)
                 
                 # Create and save product to database
                 try:
@@ -341,15 +675,15 @@ def parse_wine_csv():
                     )
                     
                     # Set optional fields only if they exist in the model
-                    if regione and hasattr(Product, 'region'):
+                    if regione and 'region' in _MAPPED_PRODUCT_FIELDS:
                         product.region = regione
-                    if vitigno and hasattr(Product, 'grape_variety'):
+                    if vitigno and 'grape_variety' in _MAPPED_PRODUCT_FIELDS:
                         product.grape_variety = vitigno
-                    if anno is not None and hasattr(Product, 'vintage'):
+                    if anno is not None and 'vintage' in _MAPPED_PRODUCT_FIELDS:
                         product.vintage = anno
-                    if produttore and hasattr(Product, 'producer'):
+                    if produttore and 'producer' in _MAPPED_PRODUCT_FIELDS:
                         product.producer = produttore
-                    if descrizione and hasattr(Product, 'description'):
+                    if descrizione and 'description' in _MAPPED_PRODUCT_FIELDS:
                         product.description = descrizione
                     
                     db.session.add(product)
@@ -387,6 +721,7 @@ def parse_wine_csv():
         if saved_count > 0:
             try:
                 db.session.commit()
+                _invalidate_products_cache(venue_id)
                 logger.info(f"CSV import complete for venue {venue_id}: {saved_count} products saved, {len(parsing_errors)} parsing errors, {len(db_errors)} DB errors")
             except Exception as commit_error:
                 db.session.rollback()
@@ -419,6 +754,65 @@ def parse_wine_csv():
         }), 500
 
 
+# Generated fields written back to existing products. Numeric levels only
+# overwrite the stored value when the model returned one.
+_GENERATED_TEXT_FIELDS = ('description', 'color', 'aromas')
+_GENERATED_LEVEL_FIELDS = ('body', 'acidity_level', 'tannin_level')
+
+
+def _save_generated_descriptions(venue_id, wines_with_descriptions):
+    """
+    Write generated descriptions back to the venue's existing products.
+    
+    All products are updated by a single UPDATE ... SET col = CASE id ... END
+    statement, restricted to the venue's products (so foreign IDs are ignored).
+    
+    Args:
+        venue_id: Venue that owns the products
+        wines_with_descriptions: Output of generate_descriptions_batch
+        
+    Returns:
+        Number of updated products
+    """
+    completed = {
+        wine_data['id']: wine_data
+        for wine_data in wines_with_descriptions
+        if wine_data.get('description_status') == 'completed' and wine_data.get('id')
+    }
+    if not completed:
+        return 0
+    
+    product_columns = _get_product_columns()
+    fields = [f for f in _GENERATED_TEXT_FIELDS + _GENERATED_LEVEL_FIELDS if f in product_columns]
+    products = table('products', column('id'), column('venue_id'), *[column(f) for f in fields])
+    
+    values = {}
+    for field in fields:
+        skip_none = field in _GENERATED_LEVEL_FIELDS
+        whens = {
+            product_id: wine_data[field]
+            for product_id, wine_data in completed.items()
+            if field in wine_data and not (skip_none and wine_data[field] is None)
+        }
+        if whens:
+            values[field] = case(whens, value=products.c.id, else_=products.c[field])
+    if not values:
+        return 0
+    
+    try:
+        result = db.session.execute(
+            update(products)
+            .where(products.c.id.in_(list(completed)), products.c.venue_id == venue_id)
+            .values(values)
+        )
+        db.session.commit()
+        return result.rowcount
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error saving generated descriptions for venue {venue_id}: {e}")
+        return 0
+
+
 @products_bp.route('/venue/<int:venue_id>/generate-descriptions', methods=['POST'])
 @jwt_required()
 def generate_wine_descriptions(venue_id):
@@ -449,36 +843,15 @@ def generate_wine_descriptions(venue_id):
             }), 400
     
     try:
+        from app.services.wine_description_generator import WineDescriptionGenerator
         generator = WineDescriptionGenerator()
         wines_with_descriptions = generator.generate_descriptions_batch(wines)
         
         # Save structured data to database if wines have IDs (already saved)
         # Otherwise, return data for frontend to save later
-        wines_to_save = []
-        for wine_data in wines_with_descriptions:
-            if wine_data.get('description_status') == 'completed' and wine_data.get('id'):
-                # Wine already exists, update it
-                try:
-                    product = Product.query.get(wine_data['id'])
-                    if product and product.venue_id == venue_id:
-                        if 'description' in wine_data:
-                            product.description = wine_data.get('description')
-                        if 'color' in wine_data:
-                            product.color = wine_data.get('color')
-                        if 'aromas' in wine_data:
-                            product.aromas = wine_data.get('aromas')
-                        if 'body' in wine_data and wine_data.get('body') is not None:
-                            product.body = wine_data.get('body')
-                        if 'acidity_level' in wine_data and wine_data.get('acidity_level') is not None:
-                            product.acidity_level = wine_data.get('acidity_level')
-                        if 'tannin_level' in wine_data and wine_data.get('tannin_level') is not None:
-                            product.tannin_level = wine_data.get('tannin_level')
-                        wines_to_save.append(product)
-                except Exception as e:
-                    logger.error(f"Error updating product {wine_data.get('id')}: {e}")
-        
-        if wines_to_save:
-            db.session.commit()
+        saved_count = _save_generated_descriptions(venue_id, wines_with_descriptions)
+        if saved_count:
+            _invalidate_products_cache(venue_id)
         
         # Count success/errors
         completed = sum(1 for w in wines_with_descriptions if w.get('description_status') == 'completed')
@@ -511,6 +884,20 @@ def get_products(venue_identifier):
     Get products for a venue.
     Can be accessed by venue_id (authenticated) or slug (public).
     """
+    # Get query parameters for filtering
+    wine_type = request.args.get('type')
+    available_only = request.args.get('available', 'true').lower() == 'true'
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    
+    # Serve repeated menu reads (every diner scanning the QR code) from memory.
+    # Keyed on the parsed filters: unrelated or reordered query params share an entry
+    cache_key = (venue_identifier, wine_type, available_only, min_price, max_price)
+    cached = _get_cached_products(cache_key)
+    if cached is not None:
+        _, is_public, body = cached
+        return _products_response(body, is_public)
+    
     # Try to find venue by slug first (public access)
     venue = Venue.query.filter_by(slug=venue_identifier, is_active=True).first()
     
@@ -525,12 +912,6 @@ def get_products(venue_identifier):
     if not venue:
         return jsonify({'message': 'Locale non trovato'}), 404
     
-    # Get query parameters for filtering
-    wine_type = request.args.get('type')
-    available_only = request.args.get('available', 'true').lower() == 'true'
-    min_price = request.args.get('min_price', type=float)
-    max_price = request.args.get('max_price', type=float)
-    
     # Build query
     query = Product.query.filter_by(venue_id=venue.id)
     
@@ -546,95 +927,33 @@ def get_products(venue_identifier):
     if max_price is not None:
         query = query.filter(Product.price <= max_price)
     
-    # Order by type and name
-    # Use raw SQL to select only fields that exist in DB
-    # First, try to get products with a safe query
+    # Select core fields plus the optional columns that actually exist in the DB,
+    # so the whole list is loaded with a single query
     try:
-        # Use with_entities to select only core fields that should exist
+        product_columns = _get_product_columns()
+        optional_columns = [c for c in _OPTIONAL_PRODUCT_COLUMNS if c in product_columns]
+        
         products = query.with_entities(
             Product.id,
             Product.venue_id,
             Product.name,
             Product.type,
             Product.price,
-            Product.is_available
-        ).order_by(Product.type, Product.name).all()
-        
-        # Convert to dict
-        result = []
-        for p in products:
-            product_dict = {
-                'id': p.id,
-                'venue_id': p.venue_id,
-                'name': p.name,
-                'type': p.type,
-                'price': float(p.price) if p.price else None,
-                'is_available': p.is_available if hasattr(p, 'is_available') else True
-            }
-            
-            # Try to get optional fields using raw SQL
-            try:
-                from sqlalchemy import text
-                optional_query = text("""
-                    SELECT region, grape_variety, vintage, description 
-                    FROM products 
-                    WHERE id = :product_id
-                """)
-                optional_result = db.session.execute(optional_query, {'product_id': p.id}).fetchone()
-                if optional_result:
-                    if optional_result[0]:  # region
-                        product_dict['region'] = optional_result[0]
-                    if optional_result[1]:  # grape_variety
-                        product_dict['grape_variety'] = optional_result[1]
-                    if optional_result[2]:  # vintage
-                        product_dict['vintage'] = optional_result[2]
-                    if optional_result[3]:  # description
-                        product_dict['description'] = optional_result[3]
-            except Exception as e:
-                logger.debug(f"Could not fetch optional fields for product {p.id}: {e}")
-            
-            result.append(product_dict)
+            Product.is_available,
+            *[literal_column(f'products.{c}').label(c) for c in optional_columns]
+        ).order_by(Product.type, Product.name).all()  # Order by type and name
+        
+        # Serialize rows directly (no ORM instances are loaded)
+        result = [Product.to_list_dict(p, optional_columns) for p in products]
         
-        return jsonify(result), 200
+        is_public = venue.slug == venue_identifier
+        body = _encode_products(result)
+        _set_cached_products(cache_key, (venue.id, is_public, body))
+        return _products_response(body, is_public)
     except Exception as e:
-        logger.error(f"Error fetching products: {e}")
-        # Fallback: try with raw SQL
-        try:
-            from sqlalchemy import text
-            sql_query = text("""
-                SELECT id, venue_id, name, type, price, is_available,
-                       region, grape_variety, vintage, description
-                FROM products 
-                WHERE venue_id = :venue_id
-                ORDER BY type, name
-            """)
-            results = db.session.execute(sql_query, {'venue_id': venue.id}).fetchall()
-            
-            products_list = []
-            for row in results:
-                product_dict = {
-                    'id': row[0],
-                    'venue_id': row[1],
-                    'name': row[2],
-                    'type': row[3],
-                    'price': float(row[4]) if row[4] else None,
-                    'is_available': row[5] if len(row) > 5 else True
-                }
-                # Add optional fields if they exist
-                if len(row) > 6 and row[6]:  # region
-                    product_dict['region'] = row[6]
-                if len(row) > 7 and row[7]:  # grape_variety
-                    product_dict['grape_variety'] = row[7]
-                if len(row) > 8 and row[8]:  # vintage
-                    product_dict['vintage'] = row[8]
-                if len(row) > 9 and row[9]:  # description
-                    product_dict['description'] = row[9]
-                products_list.append(product_dict)
-            
-            return jsonify(products_list), 200
-        except Exception as sql_error:
-            logger.error(f"Raw SQL query also failed: {sql_error}")
-            return jsonify({'message': 'Errore nel caricamento dei prodotti', 'error': str(sql_error)}), 500
+        db.session.rollback()
+        logger.error(f"Error fetching products for venue {venue.id}: {e}")
+        return jsonify({'message': 'Errore nel caricamento dei prodotti'}), 500
 
 
 @products_bp.route('/<int:product_id>', methods=['GET'])
@@ -739,13 +1058,13 @@ def create_product():
     
     db.session.add(product)
     db.session.commit()
+    _invalidate_products_cache(product.venue_id)
     
-    # Add to vector database
+    # Add to vector database in the background (embedding call is slow)
     try:
-        vector_service = VectorSearchService()
-        vector_service.index_product(product)
+        submit_task(_index_product_task, product.id)
     except Exception as e:
-        print(f"Error indexing product: {e}")
+        logger.warning(f"Error scheduling product indexing: {e}")
     
     return jsonify({
         'message': 'Prodotto creato',
@@ -785,27 +1104,27 @@ def update_product(product_id):
         product.is_available = data['is_available']
     
     # Optional fields - only set if they exist in the model
-    if 'region' in data and hasattr(Product, 'region'):
+    if 'region' in data and 'region' in _MAPPED_PRODUCT_FIELDS:
         product.region = data['region']
-    if 'grape_variety' in data and hasattr(Product, 'grape_variety'):
+    if 'grape_variety' in data and 'grape_variety' in _MAPPED_PRODUCT_FIELDS:
         product.grape_variety = data['grape_variety']
-    if 'vintage' in data and hasattr(Product, 'vintage'):
+    if 'vintage' in data and 'vintage' in _MAPPED_PRODUCT_FIELDS:
         product.vintage = data['vintage']
-    if 'description' in data and hasattr(Product, 'description'):
+    if 'description' in data and 'description' in _MAPPED_PRODUCT_FIELDS:
         product.description = data['description']
-    if 'cost_price' in data and hasattr(Product, 'cost_price'):
+    if 'cost_price' in data and 'cost_price' in _MAPPED_PRODUCT_FIELDS:
         product.cost_price = data['cost_price']
-    if 'image_url' in data and hasattr(Product, 'image_url'):
+    if 'image_url' in data and 'image_url' in _MAPPED_PRODUCT_FIELDS:
         product.image_url = data['image_url']
     
     db.session.commit()
+    _invalidate_products_cache(product.venue_id)
     
-    # Update in vector database
+    # Update in vector database in the background (embedding call is slow)
     try:
-        vector_service = VectorSearchService()
-        vector_service.index_product(product)
+        submit_task(_index_product_task, product.id)
     except Exception as e:
-        print(f"Error updating product in vector DB: {e}")
+        logger.warning(f"Error scheduling product re-indexing: {e}")
     
     return jsonify({
         'message': 'Prodotto aggiornato',
@@ -831,19 +1150,21 @@ def delete_product(product_id):
     if product.venue_id != user.venue_id:
         return jsonify({'message': 'Non autorizzato'}), 403
     
-    # Delete associated wine proposals first (to avoid foreign key constraint issues)
-    from app.models import WineProposal
-    WineProposal.query.filter_by(product_id=product_id).delete()
+    # Associated wine proposals are removed by the ON DELETE CASCADE foreign key
     
     # Remove from vector database
     try:
-        vector_service = VectorSearchService()
+        from app.services.vector_search import get_vector_service
+        vector_service = get_vector_service()
         vector_service.delete_product(product)
     except Exception as e:
         logger.warning(f"Error deleting product from vector DB: {e}")
     
+    venue_id = product.venue_id
     db.session.delete(product)
     db.session.commit()
+    _invalidate_products_cache(venue_id)
+    _forget_failed_label_uploads(product_id)
     
     return jsonify({'message': 'Prodotto eliminato'}), 200
 
@@ -853,7 +1174,8 @@ def delete_product(product_id):
 def upload_label_image(product_id):
     """
     Upload label image for a wine product.
-    Stores image and updates product.image_url
+    The image is stored in the background and product.image_url is updated
+    when the upload completes (poll /<product_id>/image-status).
     """
     current_user_id = get_jwt_identity()
     user = User.query.get(current_user_id)
@@ -869,6 +1191,11 @@ def upload_label_image(product_id):
     if product.venue_id != user.venue_id:
         return jsonify({'message': 'Non autorizzato'}), 403
     
+    # Reject oversized uploads from Content-Length (an upper bound of the file
+    # size) before request.files parses and spools the multipart body
+    if request.content_length is not None and request.content_length > _MAX_LABEL_IMAGE_SIZE:
+        return jsonify({'message': 'File troppo grande. Dimensione massima: 5MB'}), 413
+    
     # Check if file is in request
     if 'file' not in request.files:
         return jsonify({'message': 'Nessun file fornito'}), 400
@@ -878,83 +1205,96 @@ def upload_label_image(product_id):
         return jsonify({'message': 'Nessun file selezionato'}), 400
     
     # Validate file type
-    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     filename = secure_filename(file.filename)
     file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
     
-    if file_ext not in allowed_extensions:
+    if file_ext not in _LABEL_CONTENT_TYPES:
         return jsonify({
-            'message': f'Formato file non supportato. Formati consentiti: {", ".join(allowed_extensions)}'
+            'message': f'Formato file non supportato. Formati consentiti: {", ".join(_LABEL_CONTENT_TYPES)}'
         }), 400
     
-    # Validate file size (max 5MB)
-    file.seek(0, os.SEEK_END)
-    file_size = file.tell()
-    file.seek(0)
-    
-    max_size = 5 * 1024 * 1024  # 5MB
-    if file_size > max_size:
-        return jsonify({'message': 'File troppo grande. Dimensione massima: 5MB'}), 400
+    # Without Content-Length (chunked upload) measure the spooled file (O(1) seek)
+    if request.content_length is None:
+        file.stream.seek(0, os.SEEK_END)
+        file_size = file.stream.tell()
+        file.stream.seek(0)
+        if file_size > _MAX_LABEL_IMAGE_SIZE:
+            return jsonify({'message': 'File troppo grande. Dimensione massima: 5MB'}), 413
     
     try:
-        # Initialize Supabase Storage service
-        from app.services.supabase_storage import SupabaseStorageService
-        storage_service = SupabaseStorageService()
         wine_labels_bucket = current_app.config.get('SUPABASE_STORAGE_BUCKET_WINE_LABELS', 'wine-labels')
         
         # Generate unique filename
         safe_product_name = secure_filename(product.name)[:50]  # Limit length
-        unique_filename = f"{product_id}_{safe_product_name}_{os.urandom(8).hex()}.{file_ext}"
-        
-        # Read file data
-        file.seek(0)
-        file_data = file.read()
+        unique_filename = f"{product_id}_{safe_product_name}_{_unique_upload_suffix()}.{file_ext}"
         
         # Determine content type
-        content_type_map = {
-            'png': 'image/png',
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'gif': 'image/gif',
-            'webp': 'image/webp'
-        }
-        content_type = content_type_map.get(file_ext, 'image/jpeg')
-        
-        # Upload to Supabase Storage (public bucket)
-        public_url = storage_service.upload_file(
-            bucket=wine_labels_bucket,
-            file_path=unique_filename,
-            file_data=file_data,
-            content_type=content_type,
-            upsert=True
-        )
+        content_type = _LABEL_CONTENT_TYPES.get(file_ext, 'image/jpeg')
         
-        if not public_url:
-            # Fallback: try to get public URL using get_public_url
-            public_url = storage_service.get_public_url(wine_labels_bucket, unique_filename)
-        
-        if not public_url:
-            logger.error(f"Failed to upload label image to Supabase Storage for product {product_id}")
-            return jsonify({
-                'message': 'Errore durante il caricamento su Supabase Storage'
-            }), 500
+        # Spool the image to a temp file and upload it to Supabase Storage in the
+        # background: the response doesn't wait for the storage round-trips
+        with tempfile.NamedTemporaryFile(prefix='liber-label-', suffix=f'.{file_ext}', delete=False) as tmp:
+            file.stream.seek(0)
+            shutil.copyfileobj(file.stream, tmp)
+            tmp_path = tmp.name
         
-        # Update product with public URL
-        product.image_url = public_url
-        db.session.commit()
+        try:
+            submit_task(
+                _upload_label_image_task,
+                product_id, tmp_path, wine_labels_bucket, unique_filename, content_type
+            )
+        except Exception:
+            os.remove(tmp_path)
+            raise
         
-        logger.info(f"Label image uploaded to Supabase Storage for product {product_id}: {public_url}")
+        logger.info(f"Label image upload queued for product {product_id}: {unique_filename}")
         
         return jsonify({
-            'message': 'Immagine caricata con successo',
-            'image_url': public_url,
-            'product': product.to_dict(detailed=True)
-        }), 200
+            'message': 'Caricamento immagine in corso',
+            'status': 'pending',
+            'file': unique_filename,
+            'poll': f"/api/products/{product_id}/image-status?file={unique_filename}"
+        }), 202
         
     except Exception as e:
-        db.session.rollback()
         logger.error(f"Error uploading label image: {e}")
         return jsonify({
             'message': f'Errore durante il caricamento dell\'immagine: {str(e)}'
         }), 500
 
+
+@products_bp.route('/<int:product_id>/image-status', methods=['GET'])
+@jwt_required()
+def get_label_image_status(product_id):
+    """
+    Status of a queued label image upload.
+    Query param 'file' is the file name returned by the upload endpoint.
+    """
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if not user:
+        return jsonify({'message': 'Non autorizzato'}), 403
+    
+    product = Product.query.get(product_id)
+    
+    if not product:
+        return jsonify({'message': 'Prodotto non trovato'}), 404
+    
+    if product.venue_id != user.venue_id:
+        return jsonify({'message': 'Non autorizzato'}), 403
+    
+    filename = request.args.get('file', '')
+    if filename and product.image_url and product.image_url.endswith(f"/{filename}"):
+        status = 'completed'
+    elif filename and _pop_failed_label_upload(filename):
+        # Only known to the worker that ran the upload
+        status = 'failed'
+    else:
+        status = 'pending'
+    
+    return jsonify({
+        'status': status,
+        'image_url': product.image_url
+    }), 200
+
@@ -2,39 +2,152 @@
 Venue Routes for LIBER Sommelier AI
 """
 import logging
+import threading
+import time
+from collections import OrderedDict
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select, update
 from app import db
 from app.models import Venue, User
 from app.services.qr_generator import QRGeneratorService
+from app.services.background_tasks import submit_task
 
 logger = logging.getLogger(__name__)
 
 venues_bp = Blueprint('venues', __name__)
 
 
+# Fields that update_venue writes directly from the request payload
+_UPDATABLE_VENUE_FIELDS = frozenset({
+    'name', 'description', 'cuisine_type', 'menu_style', 
+    'preferences', 'target_audience', 'logo_url', 'primary_color',
+    'welcome_message', 'sommelier_style', 'is_onboarded'
+})
+
+# Columns returned by the public venue endpoint
+_PUBLIC_VENUE_COLUMNS = (
+    Venue.id, Venue.name, Venue.slug, Venue.description, Venue.cuisine_type,
+    Venue.logo_url, Venue.primary_color, Venue.welcome_message
+)
+
+# In-process cache of public venue info by slug (LRU, per worker)
+_PUBLIC_VENUE_CACHE_TTL = 60  # seconds
+_PUBLIC_VENUE_CACHE_MAX_ENTRIES = 1024
+_public_venue_cache = OrderedDict()
+_public_venue_cache_lock = threading.Lock()
+
+
+def _get_cached_public_venue(slug):
+    """Return the cached public info of a venue, if fresh."""
+    with _public_venue_cache_lock:
+        entry = _public_venue_cache.get(slug)
+        if entry is None:
+            return None
+        expires_at, venue_info = entry
+        if expires_at < time.monotonic():
+            del _public_venue_cache[slug]
+            return None
+        _public_venue_cache.move_to_end(slug)
+        return venue_info
+
+
+def _set_cached_public_venue(slug, venue_info):
+    """Cache the public info of a venue, evicting the least recently used."""
+    with _public_venue_cache_lock:
+        _public_venue_cache[slug] = (time.monotonic() + _PUBLIC_VENUE_CACHE_TTL, venue_info)
+        _public_venue_cache.move_to_end(slug)
+        if len(_public_venue_cache) > _PUBLIC_VENUE_CACHE_MAX_ENTRIES:
+            _public_venue_cache.popitem(last=False)
+
+
+def _invalidate_public_venue(slug):
+    """Drop the cached public info of a venue after it changes."""
+    with _public_venue_cache_lock:
+        _public_venue_cache.pop(slug, None)
+
+
+def _persist_qr_code_url(venue_id, storage_path):
+    """Save the QR code storage path of a venue, unless it was already set (background task)."""
+    db.session.execute(
+        update(Venue)
+        .where(Venue.id == venue_id, Venue.qr_code_url.is_(None))
+        .values(qr_code_url=storage_path)
+    )
+    db.session.commit()
+
+
+def _generate_venue_qr_task(venue_id):
+    """Generate the venue QR code, upload it and save its storage path (background task)."""
+    venue = Venue.query.get(venue_id)
+    if not venue:
+        return
+    
+    storage_path = QRGeneratorService().generate_for_venue(venue)
+    db.session.execute(
+        update(Venue).where(Venue.id == venue_id).values(qr_code_url=storage_path)
+    )
+    db.session.commit()
+
+
+def _extract_qr_filename(storage_path, bucket):
+    """
+    Get the file name inside the bucket from a stored QR code path.
+    
+    Args:
+        storage_path: Stored path, e.g. "qrcodes/qr_slug.png" (or just "qr_slug.png")
+        bucket: QR code bucket name
+        
+    Returns:
+        Path relative to the bucket, e.g. "qr_slug.png"
+    """
+    return storage_path.removeprefix(f"{bucket}/")
+
+
+def _load_venue_for_user(user_id, venue_id):
+    """
+    Load a venue only if it belongs to the given user, with a single query.
+    
+    Args:
+        user_id: ID of the authenticated user (JWT identity)
+        venue_id: Requested venue ID
+        
+    Returns:
+        Venue instance, or None if the user doesn't exist or doesn't own the venue
+    """
+    return db.session.execute(
+        select(Venue)
+        .join(User, User.venue_id == Venue.id)
+        .where(User.id == user_id, Venue.id == venue_id)
+    ).scalar_one_or_none()
+
+
 @venues_bp.route('/<slug>', methods=['GET'])
 def get_venue_by_slug(slug):
     """
     Get venue information by slug.
     Public endpoint for customer access via QR code.
     """
-    venue = Venue.query.filter_by(slug=slug, is_active=True).first()
+    # Public venue info is read on every QR scan and rarely changes
+    cached = _get_cached_public_venue(slug)
+    if cached is not None:
+        return jsonify(cached), 200
     
-    if not venue:
+    # Select only the returned columns (skips the JSON preference blobs)
+    row = db.session.execute(
+        select(*_PUBLIC_VENUE_COLUMNS).where(Venue.slug == slug, Venue.is_active.is_(True))
+    ).first()
+    
+    if not row:
         return jsonify({'message': 'Locale non trovato'}), 404
     
     # Return limited info for public access
-    return jsonify({
-        'id': venue.id,
-        'name': venue.name,
-        'slug': venue.slug,
-        'description': venue.description,
-        'cuisine_type': venue.cuisine_type,
-        'logo_url': venue.logo_url,
-        'primary_color': venue.primary_color,
-        'welcome_message': venue.welcome_message or 'Benvenuto! Sono il tuo sommelier virtuale. Come posso aiutarti nella scelta del vino oggi?'
-    }), 200
+    venue_info = dict(row._mapping)
+    venue_info['welcome_message'] = venue_info['welcome_message'] or 'Benvenuto! Sono il tuo sommelier virtuale. Come posso aiutarti nella scelta del vino oggi?'
+    
+    _set_cached_public_venue(slug, venue_info)
+    
+    return jsonify(venue_info), 200
 
 
 @venues_bp.route('/<int:venue_id>', methods=['GET'])
@@ -42,15 +155,10 @@ def get_venue_by_slug(slug):
 def get_venue(venue_id):
     """Get venue details (authenticated - owner only)."""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user or user.venue_id != venue_id:
-        return jsonify({'message': 'Non autorizzato'}), 403
-    
-    venue = Venue.query.get(venue_id)
+    venue = _load_venue_for_user(current_user_id, venue_id)
     
     if not venue:
-        return jsonify({'message': 'Locale non trovato'}), 404
+        return jsonify({'message': 'Non autorizzato'}), 403
     
     return jsonify(venue.to_dict(include_stats=True)), 200
 
@@ -60,20 +168,27 @@ def get_venue(venue_id):
 def update_venue(venue_id):
     """Update venue information."""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    venue = _load_venue_for_user(current_user_id, venue_id)
     
-    if not user or user.venue_id != venue_id:
+    if not venue:
         logger.warning(f"Unauthorized venue update attempt: user {current_user_id} for venue {venue_id}")
         return jsonify({'message': 'Non autorizzato'}), 403
     
-    venue = Venue.query.get(venue_id)
+    data = request.get_json(silent=True) or {}
+    logger.info(f"Updating venue {venue_id} with data: {list(data.keys()) if data else 'None'}")
     
-    if not venue:
-        logger.warning(f"Venue not found for update: {venue_id}")
-        return jsonify({'message': 'Locale non trovato'}), 404
+    # Stats cost three COUNTs plus the conversation count: only on request
+    include_stats = request.args.get('include_stats', 'false').lower() == 'true'
     
-    data = request.get_json()
-    logger.info(f"Updating venue {venue_id} with data: {list(data.keys()) if data else 'None'}")
+    # Nothing to update: answer without opening a write transaction
+    if not data:
+        return jsonify({
+            'message': 'Nessun cambiamento',
+            'changed': [],
+            'venue': venue.to_dict(include_stats=include_stats)
+        }), 200
+    
+    special_fields_updated = []
     
     # Handle featured_wines separately with validation
     if 'featured_wines' in data:
@@ -84,6 +199,7 @@ def update_venue(venue_id):
         # featured_wines is now saved in venue.preferences via set_featured_wines
         # Remove from data to avoid double processing
         data.pop('featured_wines')
+        special_fields_updated.append('featured_wines')
     
     # Handle annual_conversation_limit separately to initialize start date
     if 'annual_conversation_limit' in data:
@@ -95,27 +211,30 @@ def update_venue(venue_id):
         # Update the limit
         venue.annual_conversation_limit = new_limit
         data.pop('annual_conversation_limit')
-    
-    # Update allowed fields
-    updatable_fields = [
-        'name', 'description', 'cuisine_type', 'menu_style', 
-        'preferences', 'target_audience', 'logo_url', 'primary_color',
-        'welcome_message', 'sommelier_style', 'is_onboarded'
-    ]
-    
-    changes = {}
-    for field in updatable_fields:
-        if field in data:
-            old_value = getattr(venue, field)
-            new_value = data[field]
-            if old_value != new_value:
-                setattr(venue, field, new_value)
-                changes[field] = {'old': old_value, 'new': new_value}
-    
-    if changes:
-        logger.info(f"Venue {venue_id} changes: {changes}")
+        special_fields_updated.append('annual_conversation_limit')
+    
+    # Update allowed fields, skipping values identical to the loaded row
+    payload = {
+        field: data[field] for field in data.keys() & _UPDATABLE_VENUE_FIELDS
+        if getattr(venue, field) != data[field]
+    }
+    
+    if payload or special_fields_updated:
+        if payload:
+            # Old/new diff only when debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                changes = {
+                    field: {'old': getattr(venue, field), 'new': value}
+                    for field, value in payload.items()
+                }
+                logger.debug(f"Venue {venue_id} changes: {changes}")
+            logger.info(f"Venue {venue_id} updating fields: {list(payload)}")
         try:
+            # Write the plain fields with a single UPDATE (no per-attribute ORM diff)
+            if payload:
+                db.session.execute(update(Venue).where(Venue.id == venue_id).values(**payload))
             db.session.commit()
+            _invalidate_public_venue(venue.slug)
             logger.info(f"Venue {venue_id} updated successfully. is_onboarded: {venue.is_onboarded}")
         except Exception as e:
             db.session.rollback()
@@ -126,7 +245,8 @@ def update_venue(venue_id):
     
     return jsonify({
         'message': 'Locale aggiornato',
-        'venue': venue.to_dict(include_stats=True)
+        'changed': [*payload, *special_fields_updated],
+        'venue': venue.to_dict(include_stats=include_stats)
     }), 200
 
 
@@ -135,42 +255,35 @@ def update_venue(venue_id):
 def get_qr_code(venue_id):
     """Get or generate QR code for the venue."""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user or user.venue_id != venue_id:
-        return jsonify({'message': 'Non autorizzato'}), 403
-    
-    venue = Venue.query.get(venue_id)
+    venue = _load_venue_for_user(current_user_id, venue_id)
     
     if not venue:
-        return jsonify({'message': 'Locale non trovato'}), 404
+        return jsonify({'message': 'Non autorizzato'}), 403
     
-    # Generate QR code as base64 for immediate display
     qr_service = QRGeneratorService()
-    qr_base64 = qr_service.generate_base64(venue)
     
     # Also save file version if not exists (returns storage path like "qrcodes/qr_slug.png")
     storage_path = None
     if not venue.qr_code_url:
-        storage_path = qr_service.generate_for_venue(venue)
-        venue.qr_code_url = storage_path
-        db.session.commit()
+        # First generation: render the styled PNG once, upload it and show it inline
+        qr_png = qr_service.generate_bytes(venue)
+        qr_base64 = qr_service.generate_base64(venue, png_data=qr_png)
+        storage_path = qr_service.generate_for_venue(venue, png_data=qr_png)
+        # Persist the path in the background, the response doesn't need to wait
+        submit_task(_persist_qr_code_url, venue.id, storage_path)
     else:
+        # The styled file already exists: a plain render is enough for immediate display
+        qr_base64 = qr_service.generate_base64(venue)
         storage_path = venue.qr_code_url
     
     # Generate signed URL for download (bucket is private)
     signed_url = None
     if storage_path:
-        # Extract filename from storage path (format: "qrcodes/qr_slug.png" or "qrcodes/qr_slug.png")
-        from app.services.supabase_storage import SupabaseStorageService
-        storage_service = SupabaseStorageService()
+        from app.services.supabase_storage import get_storage_service
+        storage_service = get_storage_service()
         qr_bucket = current_app.config.get('SUPABASE_STORAGE_BUCKET_QRCODES', 'qrcodes')
         
-        # Extract filename (everything after the bucket name and slash)
-        if '/' in storage_path:
-            filename = storage_path.split('/', 1)[1] if storage_path.startswith(f"{qr_bucket}/") else storage_path
-        else:
-            filename = storage_path
+        filename = _extract_qr_filename(storage_path, qr_bucket)
         
         # Generate signed URL (valid for 1 hour)
         signed_url = storage_service.get_signed_url(qr_bucket, filename, expires_in=3600)
@@ -188,39 +301,32 @@ def get_qr_code(venue_id):
 def regenerate_qr_code(venue_id):
     """Regenerate QR code for the venue."""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user or user.venue_id != venue_id:
-        return jsonify({'message': 'Non autorizzato'}), 403
-    
-    venue = Venue.query.get(venue_id)
+    venue = _load_venue_for_user(current_user_id, venue_id)
     
     if not venue:
-        return jsonify({'message': 'Locale non trovato'}), 404
+        return jsonify({'message': 'Non autorizzato'}), 403
     
     qr_service = QRGeneratorService()
     
-    # Regenerate file and get base64
-    storage_path = qr_service.generate_for_venue(venue, force_regenerate=True)
+    # Regenerate file and get base64 from the same rendered PNG
+    qr_png = qr_service.generate_bytes(venue)
+    storage_path = qr_service.generate_for_venue(venue, force_regenerate=True, png_data=qr_png)
     venue.qr_code_url = storage_path
-    qr_base64 = qr_service.generate_base64(venue)
+    qr_base64 = qr_service.generate_base64(venue, png_data=qr_png)
     db.session.commit()
     
     # Generate signed URL for download (bucket is private)
     signed_url = None
     if storage_path:
-        from app.services.supabase_storage import SupabaseStorageService
-        storage_service = SupabaseStorageService()
+        from app.services.supabase_storage import get_storage_service
+        storage_service = get_storage_service()
         qr_bucket = current_app.config.get('SUPABASE_STORAGE_BUCKET_QRCODES', 'qrcodes')
         
-        # Extract filename from storage path
-        if '/' in storage_path:
-            filename = storage_path.split('/', 1)[1] if storage_path.startswith(f"{qr_bucket}/") else storage_path
-        else:
-            filename = storage_path
+        filename = _extract_qr_filename(storage_path, qr_bucket)
         
-        # Generate signed URL (valid for 1 hour)
-        signed_url = storage_service.get_signed_url(qr_bucket, filename, expires_in=3600)
+        # Generate signed URL (valid for 1 hour); sign a new one so clients
+        # don't keep showing the cached old image
+        signed_url = storage_service.get_signed_url(qr_bucket, filename, expires_in=3600, reuse_cached=False)
     
     return jsonify({
         'message': 'QR code rigenerato',
@@ -236,35 +342,31 @@ def regenerate_qr_code(venue_id):
 def complete_onboarding(venue_id):
     """Complete venue onboarding with preferences."""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user or user.venue_id != venue_id:
-        return jsonify({'message': 'Non autorizzato'}), 403
-    
-    venue = Venue.query.get(venue_id)
+    venue = _load_venue_for_user(current_user_id, venue_id)
     
     if not venue:
-        return jsonify({'message': 'Locale non trovato'}), 404
+        return jsonify({'message': 'Non autorizzato'}), 403
     
     data = request.get_json()
     
-    # Update onboarding data
+    # Update onboarding data with a single UPDATE; the QR code path is written
+    # later by its own short UPDATE in the background task
+    values = {'is_onboarded': True}
     if 'cuisine_type' in data:
-        venue.cuisine_type = data['cuisine_type']
+        values['cuisine_type'] = data['cuisine_type']
     if 'target_audience' in data:
-        venue.target_audience = data['target_audience']
+        values['target_audience'] = data['target_audience']
     if 'menu_style' in data:
-        venue.menu_style = {'style': data['menu_style']}
+        values['menu_style'] = {'style': data['menu_style']}
     if 'preferences' in data:
-        venue.preferences = data['preferences']
-    
-    venue.is_onboarded = True
-    
-    # Generate QR code
-    qr_service = QRGeneratorService()
-    venue.qr_code_url = qr_service.generate_for_venue(venue)
+        values['preferences'] = data['preferences']
     
+    db.session.execute(update(Venue).where(Venue.id == venue_id).values(**values))
     db.session.commit()
+    _invalidate_public_venue(venue.slug)
+    
+    # Generate and upload the QR code in the background (Supabase round-trips)
+    submit_task(_generate_venue_qr_task, venue.id)
     
     return jsonify({
         'message': 'Onboarding completato',
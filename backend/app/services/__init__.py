@@ -1,19 +1,32 @@
 """
 Service Layer for LIBER Sommelier AI
+
+Services are imported lazily (PEP 562): importing one service module, e.g.
+app.services.supabase_storage, doesn't load the others and their dependencies.
 """
-from app.services.ai_agent import AIAgentService
-from app.services.vector_search import VectorSearchService
-from app.services.conversation_manager import ConversationManager
-from app.services.qr_generator import QRGeneratorService
-from app.services.menu_parser import MenuParserService
-from app.services.wine_parser import WineParserService
+import importlib
+
+_LAZY_SERVICES = {
+    'AIAgentService': 'app.services.ai_agent',
+    'VectorSearchService': 'app.services.vector_search',
+    'ConversationManager': 'app.services.conversation_manager',
+    'QRGeneratorService': 'app.services.qr_generator',
+    'MenuParserService': 'app.services.menu_parser',
+    'WineParserService': 'app.services.wine_parser'
+}
 
 __all__ = [
     'AIAgentService',
-    'VectorSearchService', 
+    'VectorSearchService',
     'ConversationManager',
     'QRGeneratorService',
     'MenuParserService',
     'WineParserService'
 ]
 
+
+def __getattr__(name):
+    if name in _LAZY_SERVICES:
+        module = importlib.import_module(_LAZY_SERVICES[name])
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
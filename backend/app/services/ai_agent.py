@@ -2,21 +2,175 @@
 AI Agent Service for LIBER
 Orchestrates conversations with OpenAI GPT and vector search
 """
+import copy
+import hashlib
 import json
 import logging
-from typing import Dict, List, Optional, Any
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Any
 from openai import OpenAI, APIError, AuthenticationError, RateLimitError
 from flask import current_app
+from sqlalchemy import func, select, true
 from app import db
-from app.services.vector_search import VectorSearchService
-from app.services.fine_tuned_selector import FineTunedWineSelector
-from app.services.communication_model import CommunicationModelService
+from app.services.vector_search import get_vector_service
+from app.services.fine_tuned_selector import AIServiceUnavailableError, get_fine_tuned_selector
+from app.services.communication_model import get_communication_service
+from app.utils.singleton import process_singleton
 from app.prompts.b2b_system import get_b2b_system_prompt
-from app.prompts.b2c_system import get_b2c_system_prompt, get_b2c_opening_prompt, calculate_bottles_needed
+from app.prompts.b2c_system import (
+    get_b2c_system_prompt, get_b2c_opening_prompt, get_single_call_message_instructions, calculate_bottles_needed
+)
+
+try:
+    import orjson
+except ImportError:  # optional speedup for cache keys, stdlib json is used without it
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 
+# In-process LRU cache of filtered recommendation catalogs, keyed by
+# (venue_id, wine_type, budget_max). Each entry stores the catalog version it was
+# read at and is only reused while the venue's version is unchanged.
+_CATALOG_CACHE_MAX_ENTRIES = 256
+_catalog_cache = OrderedDict()
+_catalog_cache_lock = threading.Lock()
+
+
+# Markers of a recommendation in a free-text AI response (_is_making_recommendations),
+# matched on the lowercased text with one precompiled scan each
+_RECOMMENDATION_MARKERS = (
+    # Single wine recommendation
+    'il mio consiglio', 'vi consiglio', 'vi propongo', 'consiglio', 'raccomando',
+    'mio preferito', 'vi propongo tre vini', 'alternativa interessante',
+    'per chi ama osare', 'per chi vuole osare', 'cosa vi ispira', 'vi suggerisco',
+    'suggerisco', 'proporre', 'proposta',
+    # Wine journey/tasting path
+    'percorso di degustazione', 'percorso', 'piccolo viaggio', 'viaggio',
+    'vi porto in un', 'per iniziare', 'per proseguire', 'come si beve',
+    'ordine suggerito', 'iniziate con', 'poi passate',
+)
+_RECOMMENDATION_MARKERS_RE = re.compile('|'.join(map(re.escape, _RECOMMENDATION_MARKERS)))
+_WINE_INDICATORS_RE = re.compile('|'.join(map(re.escape, (
+    'vino', 'bottiglia', 'etichetta', 'd.o.c.', 'doc', 'igp', 'dop'
+))))
+# Explicit wine name patterns (e.g., "Pinot Noir D.O.C. 2014")
+_WINE_NAME_RE = re.compile(r'[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*(?:\s+(?:D\.O\.C\.|DOC|IGP|DOP))?(?:\s+\d{4})?')
+_PRICE_MENTION_RE = re.compile(r'(\d+)\s*(?:€|euro)')
+
+
+def _keyword_rules(*rules):
+    """Compile (value, keywords) pairs into (value, alternation regex) pairs."""
+    return tuple((value, re.compile('|'.join(map(re.escape, keywords)))) for value, keywords in rules)
+
+
+# Keyword rules of _extract_gathered_info, matched as substrings of the lowercased
+# user messages. The first matching rule wins.
+_WINE_TYPE_RULES = _keyword_rules(
+    ('red', ('rosso', 'rossi', 'red')),
+    ('white', ('bianco', 'bianchi', 'white')),
+    ('sparkling', ('bollicine', 'spumante', 'prosecco', 'champagne', 'sparkling')),
+    ('rose', ('rosato', 'rosé', 'rose')),
+    ('any', ('affido a te', 'decidi tu', 'scegli tu', 'lascia fare', 'sorprendimi', 'consiglia tu')),
+)
+_JOURNEY_RULES = _keyword_rules(
+    ('journey', ('percorso', 'viaggio', 'più vini', 'più etichette', 'diverse bottiglie', 'vini diversi')),
+    ('single', ('una bottiglia', 'un solo vino', 'unica etichetta', 'singola bottiglia', 'una sola', 'un vino solo')),
+    ('journey', ('sì percorso', 'ok percorso', 'va bene percorso', 'mi piace percorso')),
+    ('single', ('sì una', 'ok una', 'va bene una')),
+)
+_BUDGET_RULES = _keyword_rules(
+    ('high', ('senza limiti', 'nessun limite', 'spendere bene', 'importante', 'speciale', 'alto', 'premium')),
+    ('low', ('economico', 'poco', 'risparmiare', 'basso', 'contenuto', 'accessibile')),
+    ('medium', ('medio', 'normale', 'standard', 'giusto', 'ragionevole')),
+)
+_ANY_BUDGET_RE = re.compile('|'.join(map(re.escape, ('qualsiasi', 'libero', 'non importa', 'scegli tu'))))
+
+
+class CatalogWines(list):
+    """
+    Filtered catalog returned by AIAgentService._load_filtered_catalog.
+    
+    A plain list of wine dicts that also carries the text renderings of the
+    list used in prompts. The renderings are shared with the catalog cache
+    entry, so each one is built once per catalog version instead of every turn.
+    """
+    
+    def __init__(self, wines, prompt_blocks):
+        super().__init__(wines)
+        self.prompt_blocks = prompt_blocks
+    
+    def prompt_block(self, name: str, render: Callable[[List[Dict]], str]) -> str:
+        """Return the named rendering of the wine list, building it on first use."""
+        text = self.prompt_blocks.get(name)
+        if text is None:
+            text = self.prompt_blocks[name] = render(self)
+        return text
+
+
+# In-process cache of B2C responses, keyed by a hash of everything the prompts
+# are built from (venue, context, preferences, history, message and, for
+# recommendations, the filtered catalog). Each gunicorn worker keeps its own copy.
+_RESPONSE_CACHE_TTL = {'opening': 3600, 'reco': 900}  # seconds
+_RESPONSE_CACHE_MAX_ENTRIES = 1000
+_response_cache = {}
+_response_cache_lock = threading.Lock()
+
+
+def _response_cache_key(phase: str, venue, payload: Dict[str, Any]) -> str:
+    """Hash the prompt inputs of a B2C turn into a cache key."""
+    key_data = {
+        'phase': phase,
+        'venue': [venue.id, venue.name, venue.sommelier_style],
+        **payload
+    }
+    # Recommendation keys include the whole filtered catalog: orjson encodes it
+    # several times faster than json.dumps
+    if orjson is not None:
+        encoded = orjson.dumps(key_data, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    else:
+        encoded = json.dumps(key_data, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _get_cached_response(key: str) -> Optional[Dict[str, Any]]:
+    """Return a copy of the cached B2C response for key, if fresh."""
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        with _response_cache_lock:
+            _response_cache.pop(key, None)
+        return None
+    # Callers annotate the result (metadata), never hand out the cached dict
+    return copy.deepcopy(value)
+
+
+def _set_cached_response(key: str, phase: str, value: Dict[str, Any]) -> None:
+    """Cache a B2C response, evicting the oldest entry when the cache is full."""
+    with _response_cache_lock:
+        if len(_response_cache) >= _RESPONSE_CACHE_MAX_ENTRIES:
+            _response_cache.pop(next(iter(_response_cache)), None)
+        _response_cache[key] = (time.monotonic() + _RESPONSE_CACHE_TTL[phase], copy.deepcopy(value))
+
+
+def _message_names_best_wine(message: str, wines: List[Dict]) -> bool:
+    """
+    Check that a selector-written message recommends the validated best wine.
+    
+    The selector writes the message before its wine list is validated, so it
+    may describe wines that were dropped; such a message is not shown.
+    """
+    best_wine = next((w for w in wines if w.get('best')), wines[0] if wines else None)
+    name = (best_wine or {}).get('name')
+    return bool(message and name) and name.casefold() in message.casefold()
+
+
 class AIAgentService:
     """
     AI Agent that handles both B2B (restaurant owner) and B2C (customer) conversations.
@@ -42,8 +196,9 @@ class AIAgentService:
             raise
         
         self.model = current_app.config.get('OPENAI_MODEL', 'gpt-4o-mini')
-        self.vector_service = VectorSearchService()
+        self.vector_service = get_vector_service()
         self.max_history = current_app.config.get('MAX_CONVERSATION_HISTORY', 20)
+        self.b2c_max_history = current_app.config.get('B2C_PROMPT_HISTORY', 6)
         
         logger.info(f"AIAgentService initialized with model: {self.model}")
         logger.info(f"OPENAI_MODEL from config: {current_app.config.get('OPENAI_MODEL')}")
@@ -73,9 +228,100 @@ class AIAgentService:
         Returns:
             Dict with 'message', 'wines', 'suggestions', 'metadata'
         """
+        history, active_context, gathered_info, use_opening_prompt = self._prepare_b2c_turn(session, user_message, context)
         
+        if use_opening_prompt:
+            return self._process_b2c_opening(venue, user_message, history, active_context, gathered_info)
+        return self._process_b2c_recommendation(venue, user_message, history, active_context, gathered_info)
+    
+    def stream_b2c_message(
+        self,
+        session,
+        venue,
+        user_message: str,
+        context: Optional[Dict] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Process a customer message like process_b2c_message, streaming the opening message.
+        
+        Opening turns yield {'delta': text} events as the model writes, so the first
+        words reach the guest before the completion ends. Recommendation turns need the
+        full structured selection first and yield no deltas.
+        
+        Args:
+            session: The current chat session
+            venue: The venue object
+            user_message: The customer's message
+            context: Context with dishes, guest_count, and preferences
+            
+        Yields:
+            {'delta': str} events, then one {'result': dict} with the same dict
+            process_b2c_message returns
+        """
+        history, active_context, gathered_info, use_opening_prompt = self._prepare_b2c_turn(session, user_message, context)
+        
+        if not use_opening_prompt:
+            yield {'result': self._process_b2c_recommendation(venue, user_message, history, active_context, gathered_info)}
+            return
+        
+        cache_key, messages = self._build_opening_request(venue, user_message, history, active_context, gathered_info)
+        cached = _get_cached_response(cache_key)
+        if cached is not None:
+            logger.info("Opening message served from response cache")
+            cached['metadata'].update(tokens_used=0, cache_hit=True)
+            yield {'delta': cached['message']}
+            yield {'result': cached}
+            return
+        
+        parts = []
+        tokens_used = 0
+        error = None
+        try:
+            logger.info(f"Streaming OpenAI API call with model: {self.model}, messages count: {len(messages)}")
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_completion_tokens=600,
+                stream=True,
+                # Usage arrives in one last chunk with no choices
+                stream_options={'include_usage': True}
+            )
+            for chunk in stream:
+                if chunk.usage:
+                    tokens_used = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield {'delta': delta}
+        except Exception as e:
+            # Text already sent can't be taken back: keep it, fall back only if nothing arrived
+            logger.error(f"Error in streamed opening message: {e}", exc_info=True)
+            error = str(e)
+        
+        ai_response = ''.join(parts).strip()
+        model_answered = bool(ai_response) and error is None
+        if not ai_response:
+            logger.warning("Streamed opening message is empty, generating fallback")
+            ai_response = self._opening_fallback_message(active_context, gathered_info)
+            yield {'delta': ai_response}
+        
+        result = self._opening_result(ai_response, tokens_used, gathered_info, error)
+        if model_answered:
+            _set_cached_response(cache_key, 'opening', result)
+        result['metadata']['cache_hit'] = False
+        yield {'result': result}
+    
+    def _prepare_b2c_turn(self, session, user_message: str, context: Optional[Dict]):
+        """
+        Load the history and resolve the context and preferences of a B2C turn.
+        
+        Returns:
+            Tuple (history, active_context, gathered_info, use_opening_prompt)
+        """
         # Get conversation history
-        history = session.get_conversation_history(limit=self.max_history)
+        history = self._load_history(session, user_message, limit=self.b2c_max_history)
         
         # Simple logic: if message_count <= 1, use opening prompt, otherwise use recommendation prompt
         message_count = session.message_count or 0
@@ -121,133 +367,190 @@ class AIAgentService:
         logger.info(f"B2C Context: dishes={len(active_context.get('dishes', []))}, guests={active_context.get('guest_count')}, prefs={gathered_info}, use_opening_prompt={use_opening_prompt}, message_count={message_count}")
         logger.info(f"Using model for {'opening' if use_opening_prompt else 'recommendation'}: {self.model if use_opening_prompt else 'fine-tuned'}")
         
-        if use_opening_prompt:
-            # Use simple opening prompt (no wine list needed, just welcome and recap)
-            system_prompt = get_b2c_opening_prompt(
-                venue_name=venue.name,
-                sommelier_style=venue.sommelier_style or 'professional',
-                context=active_context,
-                gathered_info=gathered_info
+        return history, active_context, gathered_info, use_opening_prompt
+    
+    def _load_history(self, session, user_message: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Load the conversation history to send before the current message.
+        
+        The routes save the user's message before calling the agent, so the
+        history normally ends with it. Every prompt appends the current message
+        itself: drop that copy instead of sending it twice.
+        
+        Args:
+            session: Session model instance
+            user_message: Current user message
+            limit: Most recent messages to keep (defaults to max_history)
+        """
+        limit = limit or self.max_history
+        # One extra row so the window stays full after dropping the current message
+        history = session.get_conversation_history(limit=limit + 1)
+        if history and history[-1]['role'] == 'user' and history[-1]['content'] == user_message:
+            history = history[:-1]
+        return history[-limit:]
+    
+    def _build_opening_request(
+        self,
+        venue,
+        user_message: str,
+        history: List[Dict],
+        active_context: Dict,
+        gathered_info: Dict
+    ):
+        """
+        Build the response cache key and the chat messages of an opening turn.
+        
+        Returns:
+            Tuple (cache_key, messages)
+        """
+        # Use simple opening prompt (no wine list needed, just welcome and recap)
+        system_prompt = get_b2c_opening_prompt(
+            venue_name=venue.name,
+            sommelier_style=venue.sommelier_style or 'professional',
+            context=active_context,
+            gathered_info=gathered_info
+        )
+        
+        cache_key = _response_cache_key('opening', venue, {
+            'context': active_context,
+            'prefs': gathered_info,
+            'history': history,
+            'msg': user_message.strip().lower()
+        })
+        
+        # For opening, we don't need to load wines or pass them to AI
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        # Add conversation history
+        for msg in history:
+            messages.append({"role": msg['role'], "content": msg['content']})
+        
+        # Add current user message
+        messages.append({"role": "user", "content": user_message})
+        
+        return cache_key, messages
+    
+    def _opening_fallback_message(self, active_context: Dict, gathered_info: Dict) -> str:
+        """Simple opening message used when the model fails or answers with nothing."""
+        dish_list = [d.get('name', 'Piatto') for d in active_context.get('dishes', [])]
+        guest_count = active_context.get('guest_count', 2)
+        journey_text = "un percorso di vini" if gathered_info.get('journey_preference') == 'journey' else "una singola etichetta"
+        
+        return f"Benvenuti! Ho visto che avete ordinato {', '.join(dish_list) if dish_list else 'alcuni piatti'} per {guest_count} {('persona' if guest_count == 1 else 'persone')}. Preferite {journey_text}? Avete esigenze particolari o preferenze da comunicarmi?"
+    
+    def _opening_result(
+        self,
+        message: str,
+        tokens_used: int,
+        gathered_info: Dict,
+        error: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the process_b2c_message result of an opening turn (no wine recommendations)."""
+        result = {
+            'message': message,
+            'wines': [],
+            'wine_ids': [],
+            'journeys': [],
+            'suggestions': [],
+            'mode': 'single',
+            'metadata': {
+                'model': self.model,
+                'tokens_used': tokens_used,
+                'gathered_info': gathered_info,
+                'is_recommending': False,
+                'is_opening': True
+            }
+        }
+        if error:
+            result['metadata']['error'] = error
+        return result
+    
+    def _process_b2c_opening(
+        self,
+        venue,
+        user_message: str,
+        history: List[Dict],
+        active_context: Dict,
+        gathered_info: Dict
+    ) -> Dict[str, Any]:
+        """Answer the first turn with a brief welcome and recap (no wine list needed)."""
+        cache_key, messages = self._build_opening_request(venue, user_message, history, active_context, gathered_info)
+        cached = _get_cached_response(cache_key)
+        if cached is not None:
+            logger.info("Opening message served from response cache")
+            cached['metadata'].update(tokens_used=0, cache_hit=True)
+            return cached
+        
+        # Call GPT - opening message, keep it brief
+        try:
+            logger.info(f"Calling OpenAI API with model: {self.model}, messages count: {len(messages)}")
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_completion_tokens=600  # Increased for more complete opening messages
             )
             
-            # For opening, we don't need to load wines or pass them to AI
-            # Just return the AI response without wine recommendations
-            messages = [{"role": "system", "content": system_prompt}]
+            logger.info(f"OpenAI API response received: has_choices={bool(response.choices)}, choices_count={len(response.choices) if response.choices else 0}")
             
-            # Add conversation history
-            for msg in history:
-                messages.append({"role": msg['role'], "content": msg['content']})
+            # Safely extract response content
+            if not response.choices or len(response.choices) == 0:
+                logger.error("OpenAI API returned no choices in response")
+                raise ValueError("La risposta dell'API non contiene scelte valide")
             
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
+            choice = response.choices[0]
+            if not choice.message:
+                logger.error("OpenAI API response choice has no message")
+                raise ValueError("La risposta dell'API non contiene un messaggio valido")
             
-            # Call GPT - opening message, keep it brief
-            try:
-                logger.info(f"Calling OpenAI API with model: {self.model}, messages count: {len(messages)}")
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    max_completion_tokens=600  # Increased for more complete opening messages
-                )
-                
-                logger.info(f"OpenAI API response received: has_choices={bool(response.choices)}, choices_count={len(response.choices) if response.choices else 0}")
-                
-                # Safely extract response content
-                if not response.choices or len(response.choices) == 0:
-                    logger.error("OpenAI API returned no choices in response")
-                    raise ValueError("La risposta dell'API non contiene scelte valide")
-                
-                choice = response.choices[0]
-                if not choice.message:
-                    logger.error("OpenAI API response choice has no message")
-                    raise ValueError("La risposta dell'API non contiene un messaggio valido")
-                
-                ai_response = choice.message.content
-                logger.info(f"Extracted AI response: length={len(ai_response) if ai_response else 0}, preview={ai_response[:100] if ai_response else 'None'}")
-                
-                # Ensure response is not empty
-                if not ai_response or not ai_response.strip():
-                    logger.warning("Opening message returned empty response, generating fallback")
-                    # Generate a simple opening message as fallback
-                    dish_list = [d.get('name', 'Piatto') for d in active_context.get('dishes', [])]
-                    guest_count = active_context.get('guest_count', 2)
-                    journey_text = "un percorso di vini" if gathered_info.get('journey_preference') == 'journey' else "una singola etichetta"
-                    wine_type_text = "si affida alla mia esperienza" if gathered_info.get('wine_type') == 'any' else gathered_info.get('wine_type', '')
-                    
-                    ai_response = f"Benvenuti! Ho visto che avete ordinato {', '.join(dish_list) if dish_list else 'alcuni piatti'} per {guest_count} {('persona' if guest_count == 1 else 'persone')}. Preferite {journey_text}? Avete esigenze particolari o preferenze da comunicarmi?"
-                
-                # Final validation before returning
-                if not ai_response or not isinstance(ai_response, str) or not ai_response.strip():
-                    logger.error(f"AI response is invalid: type={type(ai_response)}, value={repr(ai_response)}")
-                    raise ValueError("La risposta dell'AI è vuota o non valida")
-                
-                logger.info(f"Returning opening message: length={len(ai_response)}, preview={ai_response[:150]}")
-                
-                result = {
-                    'message': ai_response.strip(),
-                    'wines': [],
-                    'wine_ids': [],
-                    'journeys': [],
-                    'suggestions': [],
-                    'mode': 'single',
-                    'metadata': {
-                        'model': self.model,
-                        'tokens_used': response.usage.total_tokens if response.usage else 0,
-                        'gathered_info': gathered_info,
-                        'is_recommending': False,
-                        'is_opening': True
-                    }
-                }
-                
-                logger.info(f"Opening message result: message_length={len(result['message'])}, is_opening={result['metadata']['is_opening']}")
-                return result
-                
-            except Exception as e:
-                logger.error(f"Error in opening message: {e}", exc_info=True)
-                # Generate fallback opening message instead of raising
-                dish_list = [d.get('name', 'Piatto') for d in active_context.get('dishes', [])]
-                guest_count = active_context.get('guest_count', 2)
-                journey_text = "un percorso di vini" if gathered_info.get('journey_preference') == 'journey' else "una singola etichetta"
-                
-                fallback_message = f"Benvenuti! Ho visto che avete ordinato {', '.join(dish_list) if dish_list else 'alcuni piatti'} per {guest_count} {('persona' if guest_count == 1 else 'persone')}. Preferite {journey_text}? Avete esigenze particolari o preferenze da comunicarmi?"
-                
-                return {
-                    'message': fallback_message,
-                    'wines': [],
-                    'wine_ids': [],
-                    'journeys': [],
-                    'suggestions': [],
-                    'mode': 'single',
-                    'metadata': {
-                        'model': self.model,
-                        'tokens_used': 0,
-                        'gathered_info': gathered_info,
-                        'is_recommending': False,
-                        'is_opening': True,
-                        'error': str(e)
-                    }
-                }
-        
+            ai_response = choice.message.content
+            logger.info(f"Extracted AI response: length={len(ai_response) if ai_response else 0}, preview={ai_response[:100] if ai_response else 'None'}")
+            
+            # Ensure response is not empty
+            model_answered = bool(ai_response and ai_response.strip())
+            if not model_answered:
+                logger.warning("Opening message returned empty response, generating fallback")
+                ai_response = self._opening_fallback_message(active_context, gathered_info)
+            
+            logger.info(f"Returning opening message: length={len(ai_response)}, preview={ai_response[:150]}")
+            
+            result = self._opening_result(
+                ai_response.strip(),
+                response.usage.total_tokens if response.usage else 0,
+                gathered_info
+            )
+            
+            if model_answered:
+                _set_cached_response(cache_key, 'opening', result)
+            result['metadata']['cache_hit'] = False
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error in opening message: {e}", exc_info=True)
+            # Generate fallback opening message instead of raising
+            return self._opening_result(
+                self._opening_fallback_message(active_context, gathered_info), 0, gathered_info, str(e)
+            )
+    
+    def _process_b2c_recommendation(
+        self,
+        venue,
+        user_message: str,
+        history: List[Dict],
+        active_context: Dict,
+        gathered_info: Dict
+    ) -> Dict[str, Any]:
+        """Recommend wines from the venue's filtered catalog."""
         # NEW ARCHITECTURE: Two-phase approach
         # Phase 1: Fine-tuned model selects wines and returns structured JSON
         # Phase 2: Communication model generates natural language message
-        
+        # The steps are a strict chain (catalog -> Phase 1 -> Phase 2): each one
+        # consumes the previous result, so there is nothing to run concurrently here.
+
         # Get preferences for filtering
         wine_type_pref = gathered_info.get('wine_type', 'any')
         budget_pref = gathered_info.get('budget')
         
-        # Get filtered wines from the venue's catalog based on preferences
-        from app.models import Product
-        
-        # Build query with filters
-        query = Product.query.filter_by(
-            venue_id=venue.id,
-            is_available=True
-        )
-        
-        # Filter by wine type - CRITICAL: Do NOT filter if wine_type == 'any' (lascia fare a te)
         if wine_type_pref and wine_type_pref != 'any':
-            query = query.filter_by(type=wine_type_pref)
             logger.info(f"Applied wine type filter: {wine_type_pref}")
         else:
             logger.info(
@@ -264,53 +567,9 @@ class AIAgentService:
                 budget_max = 20.0
             elif budget_pref == 'spinto' or budget_pref == 'medium':
                 budget_max = 40.0
-            
-            if budget_max:
-                max_price = budget_max * 1.15  # budget + 15%
-                query = query.filter(Product.price <= max_price)
-        
-        # Use load_only to select only core columns that exist in all databases
-        # This avoids errors if optional columns (color, aromas, etc.) don't exist
-        # Include description and grape_variety for fine-tuned model context (if columns exist)
-        try:
-            # Try to include description and grape_variety if they exist
-            all_products = query.options(
-                db.load_only(
-                    Product.id,
-                    Product.venue_id,
-                    Product.name,
-                    Product.type,
-                    Product.price,
-                    Product.cost_price,
-                    Product.margin,
-                    Product.is_available,
-                    Product.image_url,
-                    Product.description,  # Include for fine-tuned model
-                    Product.grape_variety,  # Include for fine-tuned model
-                    Product.created_at,
-                    Product.updated_at
-                )
-            ).order_by(Product.type, Product.name).all()
-        except Exception:
-            # If description or grape_variety columns don't exist, load without them
-            all_products = query.options(
-                db.load_only(
-                    Product.id,
-                    Product.venue_id,
-                    Product.name,
-                    Product.type,
-                    Product.price,
-                    Product.cost_price,
-                    Product.margin,
-                    Product.is_available,
-                    Product.image_url,
-                    Product.created_at,
-                    Product.updated_at
-                )
-            ).order_by(Product.type, Product.name).all()
         
-        # Convert to dict format
-        all_wines = [p.to_dict() for p in all_products]
+        # Get filtered wines from the venue's catalog based on preferences
+        all_wines = self._load_filtered_catalog(venue.id, wine_type_pref, budget_max)
         if budget_max:
             max_price = budget_max * 1.15
             logger.info(f"Filtered wines: type={wine_type_pref}, budget_range=€0.00-€{max_price:.2f} (budget €{budget_max:.2f} +15%), result={len(all_wines)} wines from venue {venue.id}")
@@ -339,6 +598,21 @@ class AIAgentService:
             # Get featured wines from venue preferences
             featured_wines = venue.get_featured_wines() if hasattr(venue, 'get_featured_wines') else []
             
+            # The catalog is part of the key, so product edits never serve a stale pick
+            cache_key = _response_cache_key('reco', venue, {
+                'context': active_context,
+                'prefs': gathered_info,
+                'history': history,
+                'msg': user_message.strip().lower(),
+                'catalog': all_wines,
+                'featured': featured_wines
+            })
+            cached = _get_cached_response(cache_key)
+            if cached is not None:
+                logger.info("Recommendation served from response cache")
+                cached['metadata']['cache_hit'] = True
+                return cached
+            
             # Log detailed information about wines being passed to model
             logger.info(
                 f"Passing {len(all_wines)} filtered wines to fine-tuned model. "
@@ -348,27 +622,38 @@ class AIAgentService:
                 f"price_range=0-{max_price if budget_max else 'unlimited'}"
             )
             
-            # Log wine type distribution for debugging
-            if all_wines:
-                wine_types = {}
-                for wine in all_wines:
-                    wine_type = wine.get('type', 'unknown')
-                    wine_types[wine_type] = wine_types.get(wine_type, 0) + 1
+            # Log wine type distribution for debugging (O(N): only if INFO is on)
+            if all_wines and logger.isEnabledFor(logging.INFO):
+                wine_types = Counter(wine.get('type', 'unknown') for wine in all_wines)
                 logger.info(
-                    f"Wine type distribution in filtered set: {wine_types}. "
+                    f"Wine type distribution in filtered set: {dict(wine_types)}. "
                     f"Total wines: {len(all_wines)}"
                 )
             
-            fine_tuned_selector = FineTunedWineSelector()
+            # Single label: the selector can write the guest message in the same call
+            journey_pref = gathered_info.get('journey_preference', 'single')
+            message_instructions = None
+            if journey_pref == 'single' and current_app.config.get('B2C_SINGLE_CALL_RECOMMENDATIONS'):
+                message_instructions = get_single_call_message_instructions(
+                    venue.name, venue.sommelier_style or 'professional'
+                )
+            
+            # Journeys use a few bottles: the selector can work on a shortlist
+            selector_wines = all_wines
+            if journey_pref == 'journey':
+                selector_wines = self._journey_candidates(venue.id, all_wines, active_context, featured_wines, budget_max)
+            
+            fine_tuned_selector = get_fine_tuned_selector()
             wine_selection = fine_tuned_selector.select_wines(
                 venue_name=venue.name,
                 venue_id=venue.id,
                 context=active_context,
                 gathered_info=gathered_info,
-                all_wines=all_wines,
+                all_wines=selector_wines,
                 history=history,
                 user_message=user_message,
-                featured_wines=featured_wines
+                featured_wines=featured_wines,
+                message_instructions=message_instructions
             )
             
             # Log detailed information about wines returned from model
@@ -403,36 +688,44 @@ class AIAgentService:
                 )
             
             # PHASE 2: Communication model generates message
-            journey_pref = gathered_info.get('journey_preference', 'single')
-            
-            # Create a limited wine_selection with only first 3 wines for CommunicationModel
-            wine_selection_for_communication = wine_selection.copy()
-            if journey_pref == 'single' and has_wines:
-                # Limit to first 3 wines for communication model
-                wine_selection_for_communication['wines'] = wine_selection.get('wines', [])[:3]
-                logger.info(f"Passing first 3 wines to CommunicationModel (out of {len(wine_selection.get('wines', []))} total)")
-            
-            communication_service = CommunicationModelService()
-            try:
-                ai_message = communication_service.generate_message(
-                    venue_name=venue.name,
-                    sommelier_style=venue.sommelier_style or 'professional',
-                    wine_selection=wine_selection_for_communication,
-                    context=active_context,
-                    gathered_info=gathered_info,
-                    history=history,
-                    user_message=user_message
-                )
+            # (skipped when the selector already wrote it)
+            ai_message = wine_selection.pop('message', None)
+            if ai_message and not _message_names_best_wine(ai_message, wine_selection.get('wines', [])):
+                logger.warning("Selector message doesn't name the best wine, using communication model")
+                ai_message = None
+            message_from_model = bool(ai_message)
+            if ai_message:
+                logger.info(f"Selector generated message: {len(ai_message)} chars, skipping communication model")
+            else:
+                # Create a limited wine_selection with only first 3 wines for CommunicationModel
+                wine_selection_for_communication = wine_selection.copy()
+                if journey_pref == 'single' and has_wines:
+                    # Limit to first 3 wines for communication model
+                    wine_selection_for_communication['wines'] = wine_selection.get('wines', [])[:3]
+                    logger.info(f"Passing first 3 wines to CommunicationModel (out of {len(wine_selection.get('wines', []))} total)")
                 
-                # Ensure message is not empty
-                if not ai_message or not ai_message.strip():
-                    logger.warning("Communication model returned empty message, using fallback")
+                communication_service = get_communication_service()
+                try:
+                    ai_message = communication_service.generate_message(
+                        venue_name=venue.name,
+                        sommelier_style=venue.sommelier_style or 'professional',
+                        wine_selection=wine_selection_for_communication,
+                        context=active_context,
+                        gathered_info=gathered_info,
+                        history=history,
+                        user_message=user_message
+                    )
+                    
+                    # Ensure message is not empty
+                    if not ai_message or not ai_message.strip():
+                        logger.warning("Communication model returned empty message, using fallback")
+                        ai_message = self._generate_fallback_message(wine_selection, journey_pref)
+                    else:
+                        message_from_model = True
+                        logger.info(f"Communication model generated message: {len(ai_message)} chars")
+                except Exception as e:
+                    logger.warning(f"Communication model failed, using fallback: {e}")
                     ai_message = self._generate_fallback_message(wine_selection, journey_pref)
-                else:
-                    logger.info(f"Communication model generated message: {len(ai_message)} chars")
-            except Exception as e:
-                logger.warning(f"Communication model failed, using fallback: {e}")
-                ai_message = self._generate_fallback_message(wine_selection, journey_pref)
             
             # Prepare response based on mode
             
@@ -443,7 +736,7 @@ class AIAgentService:
                     all_wine_ids.extend([w.get('id') for w in journey.get('wines', []) if w.get('id')])
                 
                 logger.info(f"Returning {len(wine_selection['journeys'])} journeys with {len(all_wine_ids)} unique wines")
-                return {
+                result = {
                     'message': ai_message,
                     'journeys': wine_selection['journeys'],
                     'wine_ids': list(set(all_wine_ids)),
@@ -466,7 +759,7 @@ class AIAgentService:
                 
                 logger.info(f"Returning {len(wines_for_display)} wines for display, {len(all_ranked_wines)} total ranked wines")
                 
-                return {
+                result = {
                     'message': ai_message,
                     'wines': wines_for_display,  # Primi 3 vini per display iniziale
                     'all_rankings': all_ranked_wines,  # TUTTI i vini rankati per il modal "Valuta tutti i vini"
@@ -482,6 +775,18 @@ class AIAgentService:
                     }
                 }
             
+            # Don't keep fallback messages around once the communication model recovers
+            if message_from_model:
+                _set_cached_response(cache_key, 'reco', result)
+            result['metadata']['cache_hit'] = False
+            return result
+            
+        except AIServiceUnavailableError:
+            # OpenAI itself is throttled/unreachable (the selector shares its
+            # endpoint): the legacy prompt would hit the same wall after another
+            # full timeout, so report it right away
+            raise
+        
         except ValueError as e:
             # Configuration or expected errors - try fallback
             logger.warning(f"Error in two-phase architecture, falling back: {e}")
@@ -500,6 +805,142 @@ class AIAgentService:
                 logger.error(f"Fallback also failed: {fallback_error}")
                 raise ValueError(f"Si è verificato un errore imprevisto. Riprova.")
     
+    def _journey_candidates(
+        self,
+        venue_id: int,
+        all_wines: List[Dict],
+        active_context: Dict,
+        featured_wines: List[int],
+        budget_max: Optional[float]
+    ) -> List[Dict]:
+        """
+        Shortlist the catalog wines semantically closest to the dishes.
+        
+        Single mode ranks every wine and always gets the full catalog; journeys
+        only need a few bottles. Returns the full catalog when the shortlist is
+        disabled (B2C_JOURNEY_CANDIDATES), the semantic search is unavailable or
+        fails, or it matches too few catalog wines.
+        
+        Args:
+            venue_id: Venue ID
+            all_wines: Filtered catalog rows
+            active_context: Context with dishes
+            featured_wines: Featured product IDs (always kept)
+            budget_max: Budget per bottle, if any
+            
+        Returns:
+            Catalog rows to pass to the selector, in catalog order
+        """
+        limit = current_app.config.get('B2C_JOURNEY_CANDIDATES', 0)
+        if not limit or len(all_wines) <= limit or not self.vector_service.qdrant_client:
+            return all_wines
+        
+        dishes = [d.get('name', '') for d in active_context.get('dishes', []) if d.get('name')]
+        if not dishes:
+            return all_wines
+        
+        try:
+            # Oversample: some hits may fall outside the type/budget filtered catalog
+            results = self.vector_service.search(
+                query=f"Vino da abbinare a: {', '.join(dishes)}",
+                venue_id=venue_id,
+                limit=limit * 2,
+                max_price=budget_max * 1.15 if budget_max else None
+            )
+        except Exception as e:
+            logger.warning(f"Journey candidate search failed, using full catalog: {e}")
+            return all_wines
+        
+        keep = set(featured_wines or [])
+        catalog_ids = {wine['id'] for wine in all_wines}
+        for hit in results:
+            if len(keep) >= limit:
+                break
+            if hit.get('id') in catalog_ids:
+                keep.add(hit['id'])
+        
+        if len(keep & catalog_ids) < min(limit, 10):
+            logger.info(f"Journey candidate search matched {len(keep & catalog_ids)} wines, using full catalog")
+            return all_wines
+        
+        candidates = [wine for wine in all_wines if wine['id'] in keep]
+        logger.info(f"Journey candidates: {len(candidates)} of {len(all_wines)} wines passed to selector")
+        return candidates
+    
+    def _load_filtered_catalog(
+        self,
+        venue_id: int,
+        wine_type_pref: Optional[str],
+        budget_max: Optional[float]
+    ) -> List[Dict]:
+        """
+        Load the venue's available wines matching the type and budget filters.
+        
+        Results are cached per (venue, type, budget) and revalidated on every
+        call against the catalog version (product count, latest updated_at),
+        so inserts, edits and deletes from any worker are picked up.
+        
+        Args:
+            venue_id: Venue whose catalog to load
+            wine_type_pref: Wine type filter ('any' or falsy for all types)
+            budget_max: Budget in euros (prices up to +15% are included), None for no limit
+            
+        Returns:
+            CatalogWines of wine dicts (same shape as Product.to_dict()), ordered by type and name
+        """
+        from app.models import Product
+        
+        # One cheap aggregate instead of re-reading the catalog
+        version = tuple(db.session.execute(
+            select(func.count(), func.max(Product.updated_at)).where(Product.venue_id == venue_id)
+        ).one())
+        
+        type_filter = wine_type_pref if wine_type_pref and wine_type_pref != 'any' else None
+        cache_key = (venue_id, type_filter, budget_max)
+        with _catalog_cache_lock:
+            entry = _catalog_cache.get(cache_key)
+            if entry is not None and entry[0] == version:
+                _catalog_cache.move_to_end(cache_key)
+                return CatalogWines(entry[1], entry[2])
+        
+        # Plain columns (no ORM instances): the rows only feed the selector
+        # prompt, so skip hydration and the identity map. Only columns of
+        # idx_products_venue_available_type_name are read (is_available is pinned
+        # by the WHERE clause), so Postgres can answer with an index-only scan.
+        stmt = select(
+            Product.id,
+            Product.venue_id,
+            Product.name,
+            Product.type,
+            Product.price,
+            true().label('is_available'),
+            Product.image_url
+        ).where(
+            Product.venue_id == venue_id,
+            Product.is_available == True  # noqa: E712 - must match the partial index predicate
+        )
+        
+        # CRITICAL: Do NOT filter by type if wine_type == 'any' (lascia fare a te)
+        if type_filter:
+            stmt = stmt.where(Product.type == type_filter)
+        
+        if budget_max:
+            stmt = stmt.where(Product.price <= budget_max * 1.15)  # budget + 15%
+        
+        rows = db.session.execute(stmt.order_by(Product.type, Product.name))
+        
+        # Convert to dict format (same shape as Product.to_dict())
+        wines = [Product.to_list_dict(row, optional_fields=('image_url',)) for row in rows]
+        
+        prompt_blocks = {}
+        with _catalog_cache_lock:
+            _catalog_cache[cache_key] = (version, wines, prompt_blocks)
+            _catalog_cache.move_to_end(cache_key)
+            if len(_catalog_cache) > _CATALOG_CACHE_MAX_ENTRIES:
+                _catalog_cache.popitem(last=False)
+        
+        return CatalogWines(wines, prompt_blocks)
+    
     def _generate_fallback_message(self, wine_selection: Dict, journey_pref: str) -> str:
         """
         Generate a simple fallback message from wine selection JSON.
@@ -561,12 +1002,16 @@ class AIAgentService:
             is_first_message=False
         )
         
-        # Build context about available wines
+        # Build context about available wines (rendered once per catalog version)
+        wines_list = (
+            all_wines.prompt_block('legacy', self._build_wines_context)
+            if isinstance(all_wines, CatalogWines) else self._build_wines_context(all_wines)
+        )
         wines_context = f"""## Carta dei Vini Disponibili
 
 ⚠️ REGOLA CRITICA: Puoi proporre SOLO i vini elencati qui sotto. NON inventare MAI vini, nomi, cantine, annate o caratteristiche che non sono in questa lista.
 
-{self._build_wines_context(all_wines)}
+{wines_list}
 
 ⚠️ RICORDA: DEVI SEMPRE proporre qualcosa se ci sono vini nella lista sopra."""
         
@@ -595,13 +1040,10 @@ class AIAgentService:
         preferences = active_context.get('preferences', {})
         bottles_count = preferences.get('bottles_count')
         
-        wines_to_return = []
-        wine_ids = []
+        # One extraction per response, shared by both modes
+        wines_to_return = self._extract_recommended_wines(ai_response, all_wines)
         
-        if journey_pref == 'single':
-            wines_to_return = self._extract_recommended_wines(ai_response, all_wines)
-        else:
-            wines_to_return = self._extract_recommended_wines(ai_response, all_wines)
+        if journey_pref != 'single':
             if wines_to_return:
                 journeys = self._create_wine_journeys(
                     wines_to_return,
@@ -662,7 +1104,7 @@ class AIAgentService:
             Dict with 'message', 'wines', 'suggestions', 'metadata'
         """
         # Get conversation history
-        history = session.get_conversation_history(limit=self.max_history)
+        history = self._load_history(session, user_message)
         
         # Get system prompt
         system_prompt = get_b2b_system_prompt(
@@ -680,15 +1122,15 @@ class AIAgentService:
         
         wines_context = self._build_wines_context(suggested_wines)
         
-        # Prepare messages
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": f"Vini suggeriti per la carta:\n{wines_context}"}
-        ]
+        # Prepare messages. The per-turn wine suggestions go after the history so
+        # system prompt + history stay an identical prefix from one turn to the
+        # next, which OpenAI's automatic prompt caching can reuse.
+        messages = [{"role": "system", "content": system_prompt}]
         
         for msg in history:
             messages.append({"role": msg['role'], "content": msg['content']})
         
+        messages.append({"role": "system", "content": f"Vini suggeriti per la carta:\n{wines_context}"})
         messages.append({"role": "user", "content": user_message})
         
         try:
@@ -766,22 +1208,12 @@ class AIAgentService:
             # Ensure we always return at least some wines if available in the venue
             if not results:
                 logger.info(f"No vector search results, trying database fallback for venue {venue_id}")
-                from app.models import Product
-                products = Product.query.filter_by(
-                    venue_id=venue_id, 
-                    is_available=True
-                ).limit(10).all()
-                results = [p.to_dict() for p in products]
+                results = self._load_filtered_catalog(venue_id, None, None)[:10]
             return results
         except Exception as e:
             logger.warning(f"Vector search error, falling back to database: {e}")
-            # Fallback to database search
-            from app.models import Product
-            products = Product.query.filter_by(
-                venue_id=venue_id, 
-                is_available=True
-            ).limit(10).all()
-            return [p.to_dict() for p in products]
+            # Fallback to the (cached) catalog of available wines
+            return self._load_filtered_catalog(venue_id, None, None)[:10]
     
     def _search_wines_for_catalog(
         self, 
@@ -797,9 +1229,8 @@ class AIAgentService:
             )
             return results
         except Exception:
-            from app.models import Product
-            products = Product.query.filter_by(venue_id=venue.id).limit(5).all()
-            return [p.to_dict() for p in products]
+            # Same available-only scope as the vector search, from the cached catalog
+            return self._load_filtered_catalog(venue.id, None, None)[:5]
     
     def _is_making_recommendations(self, ai_response: str) -> bool:
         """
@@ -811,75 +1242,18 @@ class AIAgentService:
         
         This function is more permissive to catch various recommendation patterns.
         """
-        # Single wine recommendation markers
-        single_wine_markers = [
-            'il mio consiglio',
-            'vi consiglio',
-            'vi propongo',
-            'consiglio',
-            'raccomando',
-            'mio preferito',
-            'vi propongo tre vini',
-            'alternativa interessante',
-            'per chi ama osare',
-            'per chi vuole osare',
-            'cosa vi ispira',
-            'vi suggerisco',
-            'suggerisco',
-            'proporre',
-            'proposta',
-        ]
-        
-        # Wine journey/tasting path markers
-        journey_markers = [
-            'percorso di degustazione',
-            'percorso',
-            'piccolo viaggio',
-            'viaggio',
-            'vi porto in un',
-            'per iniziare',
-            'per proseguire',
-            'come si beve',
-            'ordine suggerito',
-            'iniziate con',
-            'poi passate',
-        ]
-        
-        # General wine mention indicators
-        wine_indicators = [
-            'vino',
-            'bottiglia',
-            'etichetta',
-            'd.o.c.',
-            'doc',
-            'igp',
-            'dop',
-        ]
-        
-        # Price marker - wines are often mentioned with price
-        has_price = '€' in ai_response
-        has_wine_mention = any(indicator in ai_response.lower() for indicator in wine_indicators)
-        
         response_lower = ai_response.lower()
         
-        # Check for explicit recommendation markers
-        for marker in single_wine_markers:
-            if marker in response_lower:
-                return True
-        
-        # Check for journey markers
-        for marker in journey_markers:
-            if marker in response_lower:
-                return True
+        # Explicit single wine or journey markers
+        if _RECOMMENDATION_MARKERS_RE.search(response_lower):
+            return True
         
         # More permissive: if there's a wine mention AND price, likely a recommendation
-        if has_wine_mention and has_price:
+        if '€' in ai_response and _WINE_INDICATORS_RE.search(response_lower):
             return True
         
         # Very permissive: if there's explicit wine name patterns (e.g., "Pinot Noir D.O.C. 2014")
-        import re
-        wine_name_pattern = r'[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*(?:\s+(?:D\.O\.C\.|DOC|IGP|DOP))?(?:\s+\d{4})?'
-        if re.search(wine_name_pattern, ai_response):
+        if _WINE_NAME_RE.search(ai_response):
             return True
         
         return False
@@ -911,9 +1285,10 @@ class AIAgentService:
             return []
         
         response_lower = ai_response.lower()
-        response_original = ai_response  # Keep original for exact matching
         
-        # Score each wine by how well it matches and where it appears in the response
+        # Score each wine by how well it matches and where it appears in the response.
+        # Only exact (case-insensitive) name matches are kept: partial word matches
+        # scored at most 50 and never passed the > 80 threshold below.
         wine_matches = []
         
         for wine in available_wines:
@@ -921,70 +1296,12 @@ class AIAgentService:
             if not wine_name:
                 continue
             
-            wine_name_lower = wine_name.lower()
-            wine_name_original = wine_name  # Keep original for exact matching
-            position = -1
-            match_score = 0
-            
-            # Strategy 1: Exact name match (highest priority) - check in original case too
-            if wine_name_lower in response_lower:
-                position = response_lower.find(wine_name_lower)
-                match_score = 100  # Very high score for exact match
-                # Also check if exact name appears in original response (case-insensitive but preserve case)
-                if wine_name_original.lower() in response_original.lower():
-                    match_score = 100  # Perfect match
-            elif wine_name_original.lower() in response_original.lower():
-                # Try with original case variations
-                position = response_original.lower().find(wine_name_original.lower())
-                match_score = 95  # Almost perfect
-            
-            # Strategy 2: Match by significant words (words longer than 3 chars)
-            if match_score < 50:  # Only if exact match failed
-                name_parts = [p.strip() for p in wine_name.split() 
-                            if len(p.strip()) > 3 
-                            and not p.lower() in ['d.o.c', 'doc', 'igp', 'dop', 'del', 'di', 'la', 'le', 'il', '2014', '2015', '2016', '2017', '2018', '2019', '2020', '2021', '2022', '2023', '2024']]
-                matching_parts = []
-                
-                for part in name_parts:
-                    # Find the word as a whole word (surrounded by word boundaries or spaces)
-                    import re
-                    pattern = r'\b' + re.escape(part.lower()) + r'\b'
-                    matches = list(re.finditer(pattern, response_lower))
-                    if matches:
-                        matching_parts.extend([m.start() for m in matches])
-                
-                if matching_parts:
-                    position = min(matching_parts)
-                    # Score based on how many parts matched relative to total parts
-                    if len(name_parts) > 0:
-                        matched_parts_count = len(set([p.lower() for p in name_parts 
-                                                       if any(p.lower() in response_lower[max(0, pos-10):pos+len(p)+10] 
-                                                             for pos in matching_parts)]))
-                        match_score = (matched_parts_count / len(name_parts)) * 50  # Max 50 for partial match
-                    else:
-                        match_score = 30
-            
-            # Strategy 3: Partial match for compound names (e.g., "Pinot Noir" might be mentioned as just "Pinot")
-            if match_score < 20:
-                # Try matching first significant word (longer than 4 chars)
-                first_significant_word = next((p for p in wine_name.split() if len(p) > 4), None)
-                if first_significant_word:
-                    word_lower = first_significant_word.lower()
-                    if word_lower in response_lower:
-                        # Check if it's mentioned near price or other wine indicators
-                        word_pos = response_lower.find(word_lower)
-                        context_around = response_lower[max(0, word_pos-30):word_pos+len(first_significant_word)+30]
-                        if '€' in context_around or any(indicator in context_around for indicator in ['vino', 'etichetta', 'bottiglia']):
-                            position = word_pos
-                            match_score = 20  # Lower score for partial match with context
-            
-            # Only include wines with match score > 80 (exact or very high-confidence matches only)
-            # This ensures we only return wines that are actually mentioned clearly in the text
-            if position >= 0 and match_score > 80:
+            position = response_lower.find(wine_name.lower())
+            if position >= 0:
                 wine_matches.append({
                     'wine': wine,
                     'position': position,
-                    'score': match_score
+                    'score': 100
                 })
         
         # Sort by position first (order in response), then by score (descending)
@@ -1071,55 +1388,27 @@ class AIAgentService:
             'budget': existing_info.get('budget')
         }
         
-        # Combine all messages into text for analysis
-        all_text = ""
-        for msg in history:
-            if msg.get('role') == 'user':
-                all_text += " " + msg.get('content', '').lower()
+        # Combine all user messages into text for analysis
+        all_text = ' '.join(
+            msg.get('content', '').lower() for msg in history if msg.get('role') == 'user'
+        )
         
         # Extract wine type preference
         if gathered_info['wine_type'] is None:
-            if any(word in all_text for word in ['rosso', 'rossi', 'red']):
-                gathered_info['wine_type'] = 'red'
-            elif any(word in all_text for word in ['bianco', 'bianchi', 'white']):
-                gathered_info['wine_type'] = 'white'
-            elif any(word in all_text for word in ['bollicine', 'spumante', 'prosecco', 'champagne', 'sparkling']):
-                gathered_info['wine_type'] = 'sparkling'
-            elif any(word in all_text for word in ['rosato', 'rosé', 'rose']):
-                gathered_info['wine_type'] = 'rose'
-            elif any(word in all_text for word in ['affido a te', 'decidi tu', 'scegli tu', 'lascia fare', 'sorprendimi', 'consiglia tu']):
-                gathered_info['wine_type'] = 'any'
+            gathered_info['wine_type'] = self._match_keyword_rule(_WINE_TYPE_RULES, all_text)
         
         # Extract journey preference (single bottle vs wine journey)
         if gathered_info['journey_preference'] is None:
-            # Check for journey preference
-            if any(phrase in all_text for phrase in ['percorso', 'viaggio', 'più vini', 'più etichette', 'diverse bottiglie', 'vini diversi']):
-                gathered_info['journey_preference'] = 'journey'
-            # Check for single bottle preference
-            elif any(phrase in all_text for phrase in ['una bottiglia', 'un solo vino', 'unica etichetta', 'singola bottiglia', 'una sola', 'un vino solo']):
-                gathered_info['journey_preference'] = 'single'
-            # Check for agreement patterns
-            elif any(phrase in all_text for phrase in ['sì percorso', 'ok percorso', 'va bene percorso', 'mi piace percorso']):
-                gathered_info['journey_preference'] = 'journey'
-            elif any(phrase in all_text for phrase in ['sì una', 'ok una', 'va bene una']):
-                gathered_info['journey_preference'] = 'single'
-        
-        # Extract budget preference
+            gathered_info['journey_preference'] = self._match_keyword_rule(_JOURNEY_RULES, all_text)
+        
+        # Extract budget preference (high, low, medium keywords first)
+        if gathered_info['budget'] is None:
+            gathered_info['budget'] = self._match_keyword_rule(_BUDGET_RULES, all_text)
         if gathered_info['budget'] is None:
-            # Check for high budget
-            if any(phrase in all_text for phrase in ['senza limiti', 'nessun limite', 'spendere bene', 'importante', 'speciale', 'alto', 'premium']):
-                gathered_info['budget'] = 'high'
-            # Check for low budget
-            elif any(phrase in all_text for phrase in ['economico', 'poco', 'risparmiare', 'basso', 'contenuto', 'accessibile']):
-                gathered_info['budget'] = 'low'
-            # Check for medium budget
-            elif any(phrase in all_text for phrase in ['medio', 'normale', 'standard', 'giusto', 'ragionevole']):
-                gathered_info['budget'] = 'medium'
             # Check for specific price mentions
-            elif '€' in all_text or 'euro' in all_text:
+            if '€' in all_text or 'euro' in all_text:
                 # Try to extract price and categorize
-                import re
-                prices = re.findall(r'(\d+)\s*(?:€|euro)', all_text)
+                prices = _PRICE_MENTION_RE.findall(all_text)
                 if prices:
                     max_price = max(int(p) for p in prices)
                     if max_price < 20:
@@ -1129,7 +1418,7 @@ class AIAgentService:
                     else:
                         gathered_info['budget'] = 'high'
             # Check for "any budget" signals
-            elif any(phrase in all_text for phrase in ['qualsiasi', 'libero', 'non importa', 'scegli tu']):
+            elif _ANY_BUDGET_RE.search(all_text):
                 gathered_info['budget'] = 'any'
         
         # Determine phase based on what's been gathered
@@ -1142,6 +1431,14 @@ class AIAgentService:
             'missing': [k for k, v in gathered_info.items() if v is None]
         }
     
+    @staticmethod
+    def _match_keyword_rule(rules, text: str) -> Optional[str]:
+        """Return the value of the first keyword rule found in text, or None."""
+        for value, pattern in rules:
+            if pattern.search(text):
+                return value
+        return None
+    
     def _create_wine_journeys(self, wines: List[Dict], bottles_count: int) -> List[Dict]:
         """
         Create wine journeys from a list of wines.
@@ -1162,20 +1459,20 @@ class AIAgentService:
         if not wines:
             return []
         
-        import random
-        
         # Shuffle wines to ensure variety (but keep it deterministic for same input)
-        # Use a seed based on bottles_count to get consistent but varied results
+        # Use a seed based on bottles_count to get consistent but varied results.
+        # A private Random: seeding the global one isn't thread-safe and resets
+        # every other user of the random module.
         wines_copy = wines.copy()
-        random.seed(bottles_count * 42)  # Deterministic but varied
-        random.shuffle(wines_copy)
+        random.Random(bottles_count * 42).shuffle(wines_copy)
         
         journeys = []
         used_wine_ids = set()
+        remaining_wines = iter(wines_copy)
         
-        # Helper to get next unused wine
+        # Helper to get next unused wine (wines already passed are used or invalid)
         def get_next_unused_wine():
-            for wine in wines_copy:
+            for wine in remaining_wines:
                 wine_id = wine.get('id')
                 if wine_id and wine_id not in used_wine_ids:
                     used_wine_ids.add(wine_id)
@@ -1278,3 +1575,33 @@ class AIAgentService:
             })
         
         return journeys
+
+
+@process_singleton
+def get_ai_agent() -> AIAgentService:
+    """Get the process-wide AIAgentService (first call needs an application context)."""
+    return AIAgentService()
+
+
+def prewarm_ai_services() -> None:
+    """
+    Create the AI service singletons and open their OpenAI connections.
+    
+    Runs once per worker at startup (PREWARM_SERVICES) so the first chat turn
+    doesn't pay for the Qdrant setup and the TLS handshakes. Failures are only
+    logged: the services are still created lazily on first use.
+    """
+    try:
+        services = [get_ai_agent(), get_fine_tuned_selector(), get_communication_service()]
+    except Exception as e:
+        logger.warning(f"AI services prewarm failed: {e}")
+        return
+    
+    for service in services:
+        try:
+            # Cheap authenticated request, no tokens spent
+            service.client.models.retrieve(service.model)
+        except Exception as e:
+            logger.warning(f"Prewarm of {type(service).__name__} connection failed: {e}")
+    
+    logger.info("AI services prewarmed")
@@ -0,0 +1,44 @@
+"""
+Background Task Runner for LIBER
+Runs slow side effects (vector indexing, storage uploads) outside the request path
+"""
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# One small pool per worker process - tasks are I/O bound (OpenAI, Qdrant, Supabase).
+# Each task uses a DB connection: Config sizes the SQLAlchemy pool from this count
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('BACKGROUND_TASK_WORKERS', '4')),
+    thread_name_prefix='liber-bg'
+)
+
+
+def submit_task(func, *args, **kwargs) -> Future:
+    """
+    Run a function in a background thread inside an application context.
+    
+    Must be called from a request or app context. Pass IDs rather than ORM
+    instances: the task runs with its own database session.
+    
+    Args:
+        func: Callable to run
+        *args, **kwargs: Arguments for func
+        
+    Returns:
+        Future with the function result (None if the task failed)
+    """
+    app = current_app._get_current_object()
+    
+    def run():
+        with app.app_context():
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Background task {func.__name__} failed: {e}", exc_info=True)
+                return None
+    
+    return _executor.submit(run)
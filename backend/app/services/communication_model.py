@@ -8,6 +8,7 @@ from typing import Dict, List, Optional, Any
 from openai import OpenAI, APIError, AuthenticationError, RateLimitError
 from flask import current_app
 from app.prompts.b2c_system import get_communication_prompt
+from app.utils.singleton import process_singleton
 
 logger = logging.getLogger(__name__)
 
@@ -114,3 +115,8 @@ class CommunicationModelService:
             logger.error(f"Unexpected error in generate_message: {e}")
             raise ValueError(f"Si è verificato un errore imprevisto. Riprova.")
 
+
+@process_singleton
+def get_communication_service() -> CommunicationModelService:
+    """Get the process-wide CommunicationModelService (first call needs an application context)."""
+    return CommunicationModelService()
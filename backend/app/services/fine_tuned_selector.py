@@ -5,37 +5,57 @@ Uses fine-tuned model to select wines based on context and return structured JSO
 import json
 import logging
 from typing import Dict, List, Optional, Any
-from openai import OpenAI, APIError, AuthenticationError, RateLimitError
+from openai import OpenAI, APIConnectionError, APIError, AuthenticationError, RateLimitError
 from flask import current_app
 from app.prompts.b2c_system import get_finetuned_selection_prompt
+from app.utils.singleton import process_singleton
 
 logger = logging.getLogger(__name__)
 
 
+class AIServiceUnavailableError(ValueError):
+    """
+    OpenAI can't serve requests right now (authentication, rate limit, network
+    or timeout). Another prompt would fail the same way, so callers should
+    report the error instead of falling back to a second model call.
+    Only raised when the selector shares the main OpenAI endpoint and key.
+    """
+
+
 class FineTunedWineSelector:
     """
     Service that uses fine-tuned model to select wines and return structured JSON.
     """
     
     def __init__(self):
-        api_key = current_app.config.get('OPENAI_API_KEY', '')
+        api_key = current_app.config.get('OPENAI_FINETUNED_API_KEY') or current_app.config.get('OPENAI_API_KEY', '')
+        base_url = current_app.config.get('OPENAI_FINETUNED_BASE_URL')
+        # With its own endpoint or key, an outage of the selector says nothing
+        # about OpenAI: errors stay plain ValueErrors so the legacy fallback runs
+        self.dedicated_endpoint = bool(base_url or current_app.config.get('OPENAI_FINETUNED_API_KEY'))
         
         if not api_key or not api_key.strip():
             logger.error("OPENAI_API_KEY is not configured!")
             raise ValueError("OPENAI_API_KEY non configurata. Contatta l'amministratore del sistema.")
         
         try:
-            self.client = OpenAI(api_key=api_key, timeout=60.0)  # 60 second timeout for fine-tuned
+            # 60 second timeout for fine-tuned, no SDK retry: the selection takes at
+            # most one 60s attempt (a retry would allow ~2x60s plus backoff, over
+            # gunicorn's 120s before the message is even written); failures fall back
+            self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=60.0, max_retries=0)
         except TypeError as e:
             import os
             os.environ['OPENAI_API_KEY'] = api_key
-            self.client = OpenAI(timeout=60.0)
+            self.client = OpenAI(base_url=base_url, timeout=60.0, max_retries=0)
         except Exception as e:
             logger.error(f"Error initializing OpenAI client: {e}")
             raise
         
         self.model = current_app.config.get('OPENAI_FINETUNED_MODEL', 'gpt-4o-mini')
-        logger.info(f"FineTunedWineSelector initialized with model: {self.model} (from OPENAI_FINETUNED_MODEL)")
+        logger.info(
+            f"FineTunedWineSelector initialized with model: {self.model} (from OPENAI_FINETUNED_MODEL)"
+            f"{f', endpoint: {base_url}' if base_url else ''}"
+        )
     
     def select_wines(
         self,
@@ -46,7 +66,8 @@ class FineTunedWineSelector:
         all_wines: List[Dict],
         history: List[Dict],
         user_message: str,
-        featured_wines: Optional[List[int]] = None
+        featured_wines: Optional[List[int]] = None,
+        message_instructions: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Select wines using fine-tuned model and return structured JSON.
@@ -60,9 +81,12 @@ class FineTunedWineSelector:
             history: Conversation history
             user_message: Current user message
             featured_wines: Optional list of product IDs that should be prioritized (max 2)
+            message_instructions: Optional instructions asking the model to also write
+                the guest message (see get_single_call_message_instructions)
             
         Returns:
-            Dict with 'wines' (for single mode) or 'journeys' (for journey mode)
+            Dict with 'wines' (for single mode) or 'journeys' (for journey mode),
+            plus 'message' when message_instructions is given (None if the model omitted it)
         """
         if not all_wines:
             logger.warning("No wines available for selection")
@@ -76,6 +100,8 @@ class FineTunedWineSelector:
             all_wines=all_wines,
             featured_wines=featured_wines or []
         )
+        if message_instructions:
+            system_prompt = f"{system_prompt}\n\n{message_instructions}"
         
         # Build conversation context for the model - limit history for speed
         messages = [{"role": "system", "content": system_prompt}]
@@ -155,15 +181,24 @@ class FineTunedWineSelector:
                 featured_wines=featured_wines or []
             )
             
+            if message_instructions:
+                message = result_json.get('message')
+                validated_result['message'] = message.strip() if isinstance(message, str) and message.strip() else None
+            
             return validated_result
             
         except AuthenticationError as e:
             logger.error(f"OpenAI Authentication Error: {e}")
-            raise ValueError("Errore di autenticazione con il servizio AI. Verifica la configurazione API.")
+            raise self._unavailable_error("Errore di autenticazione con il servizio AI. Verifica la configurazione API.")
         
         except RateLimitError as e:
             logger.error(f"OpenAI Rate Limit Error: {e}")
-            raise ValueError("Servizio AI momentaneamente sovraccarico. Riprova tra qualche secondo.")
+            raise self._unavailable_error("Servizio AI momentaneamente sovraccarico. Riprova tra qualche secondo.")
+        
+        except APIConnectionError as e:
+            # Includes timeouts (APITimeoutError)
+            logger.error(f"OpenAI Connection Error: {e}")
+            raise self._unavailable_error("Servizio AI momentaneamente non raggiungibile. Riprova tra qualche secondo.")
         
         except APIError as e:
             logger.error(f"OpenAI API Error: {e}")
@@ -173,6 +208,12 @@ class FineTunedWineSelector:
             logger.error(f"Unexpected error in select_wines: {e}")
             raise ValueError(f"Si è verificato un errore imprevisto. Riprova.")
     
+    def _unavailable_error(self, message: str) -> ValueError:
+        """Error for an unreachable/refusing selector endpoint (see AIServiceUnavailableError)."""
+        if self.dedicated_endpoint:
+            return ValueError(message)
+        return AIServiceUnavailableError(message)
+    
     def _validate_and_enrich_result(
         self,
         result_json: Dict,
@@ -541,3 +582,8 @@ class FineTunedWineSelector:
         
         return validated
 
+
+@process_singleton
+def get_fine_tuned_selector() -> FineTunedWineSelector:
+    """Get the process-wide FineTunedWineSelector (first call needs an application context)."""
+    return FineTunedWineSelector()
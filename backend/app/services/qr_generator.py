@@ -13,7 +13,7 @@ from qrcode.image.styles.moduledrawers import RoundedModuleDrawer
 from qrcode.image.styles.colormasks import SolidFillColorMask
 from PIL import Image
 from flask import current_app
-from app.services.supabase_storage import SupabaseStorageService
+from app.services.supabase_storage import get_storage_service
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +27,7 @@ class QRGeneratorService:
     
     def __init__(self):
         self.frontend_url = current_app.config.get('FRONTEND_URL', 'http://localhost:5173')
-        self.storage_service = SupabaseStorageService()
+        self.storage_service = get_storage_service()
         self.qr_bucket = current_app.config.get('SUPABASE_STORAGE_BUCKET_QRCODES', 'qrcodes')
         
         # Fallback: ensure local storage directory exists (for development/fallback)
@@ -37,7 +37,8 @@ class QRGeneratorService:
     def generate_for_venue(
         self, 
         venue, 
-        force_regenerate: bool = False
+        force_regenerate: bool = False,
+        png_data: Optional[bytes] = None
     ) -> str:
         """
         Generate a QR code for a venue and upload to Supabase Storage.
@@ -46,6 +47,7 @@ class QRGeneratorService:
         Args:
             venue: Venue model instance
             force_regenerate: Force regeneration even if exists
+            png_data: PNG already rendered with generate_bytes (rendered here if omitted)
             
         Returns:
             Storage path (not URL, since bucket is private) - format: "qrcodes/qr_{venue.slug}.png"
@@ -59,6 +61,41 @@ class QRGeneratorService:
             # Return storage path (not URL, since bucket is private)
             return f"{self.qr_bucket}/{storage_path}"
         
+        if png_data is None:
+            png_data = self.generate_bytes(venue)
+        
+        # Upload to Supabase Storage (private bucket)
+        public_url = self.storage_service.upload_file(
+            bucket=self.qr_bucket,
+            file_path=storage_path,
+            file_data=png_data,
+            content_type='image/png',
+            upsert=True
+        )
+        
+        # Since bucket is private, public_url will be None
+        # Return storage path identifier instead
+        if public_url is None:
+            # Upload succeeded but bucket is private, return storage path
+            logger.info(f"QR code uploaded to Supabase Storage: {self.qr_bucket}/{storage_path}")
+            return f"{self.qr_bucket}/{storage_path}"
+        else:
+            # Should not happen for private bucket, but handle anyway
+            logger.warning(f"QR code uploaded but got public URL (bucket may be public): {public_url}")
+            return f"{self.qr_bucket}/{storage_path}"
+    
+    def generate_bytes(self, venue) -> bytes:
+        """
+        Render the venue QR code as PNG bytes.
+        Render once and pass the bytes to generate_for_venue/generate_base64
+        when both the stored file and the inline image are needed.
+        
+        Args:
+            venue: Venue model instance
+            
+        Returns:
+            PNG image bytes
+        """
         # Generate the URL
         venue_url = f"{self.frontend_url}/v/{venue.slug}"
         
@@ -100,62 +137,43 @@ class QRGeneratorService:
         # Convert image to bytes
         buffer = io.BytesIO()
         img.save(buffer, format='PNG')
-        buffer.seek(0)
-        file_data = buffer.getvalue()
-        
-        # Upload to Supabase Storage (private bucket)
-        public_url = self.storage_service.upload_file(
-            bucket=self.qr_bucket,
-            file_path=storage_path,
-            file_data=file_data,
-            content_type='image/png',
-            upsert=True
-        )
-        
-        # Since bucket is private, public_url will be None
-        # Return storage path identifier instead
-        if public_url is None:
-            # Upload succeeded but bucket is private, return storage path
-            logger.info(f"QR code uploaded to Supabase Storage: {self.qr_bucket}/{storage_path}")
-            return f"{self.qr_bucket}/{storage_path}"
-        else:
-            # Should not happen for private bucket, but handle anyway
-            logger.warning(f"QR code uploaded but got public URL (bucket may be public): {public_url}")
-            return f"{self.qr_bucket}/{storage_path}"
+        return buffer.getvalue()
     
-    def generate_base64(self, venue) -> str:
+    def generate_base64(self, venue, png_data: Optional[bytes] = None) -> str:
         """
         Generate a QR code and return as base64 encoded string.
         Useful for inline display.
         
         Args:
             venue: Venue model instance
+            png_data: PNG already rendered with generate_bytes (a plain, unstyled
+                render is made here if omitted)
             
         Returns:
             Base64 encoded PNG image
         """
-        venue_url = f"{self.frontend_url}/v/{venue.slug}"
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=2
-        )
-        qr.add_data(venue_url)
-        qr.make(fit=True)
-        
-        primary_color = venue.primary_color or '#722F37'
-        fill_color = self._hex_to_rgb(primary_color)
-        
-        img = qr.make_image(fill_color=fill_color, back_color=(255, 255, 255))
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
+        if png_data is None:
+            venue_url = f"{self.frontend_url}/v/{venue.slug}"
+            
+            qr = qrcode.QRCode(
+                version=1,
+                error_correction=qrcode.constants.ERROR_CORRECT_H,
+                box_size=10,
+                border=2
+            )
+            qr.add_data(venue_url)
+            qr.make(fit=True)
+            
+            primary_color = venue.primary_color or '#722F37'
+            fill_color = self._hex_to_rgb(primary_color)
+            
+            img = qr.make_image(fill_color=fill_color, back_color=(255, 255, 255))
+            
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG')
+            png_data = buffer.getvalue()
         
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        return base64.b64encode(png_data).decode('utf-8')
     
     def generate_printable(
         self, 
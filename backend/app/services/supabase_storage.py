@@ -4,12 +4,19 @@ Handles file uploads and management in Supabase Storage buckets
 """
 import io
 import logging
-from typing import Optional
+import threading
+import time
+from typing import BinaryIO, Optional
+import httpx
 from flask import current_app
 from supabase import create_client, Client
+from app.utils.singleton import process_singleton
 
 logger = logging.getLogger(__name__)
 
+# Signed URLs are reused until they are this close to expiring
+SIGNED_URL_REFRESH_MARGIN = 300  # seconds
+
 
 class SupabaseStorageService:
     """
@@ -31,6 +38,24 @@ class SupabaseStorageService:
             except Exception as e:
                 logger.error(f"Failed to initialize Supabase client: {e}")
                 self.client = None
+        
+        # Signed URLs already minted: (bucket, file_path, expires_in) -> (expires_at, url)
+        self._signed_urls = {}
+        self._signed_urls_lock = threading.Lock()
+        
+        # HTTP client for streaming uploads to the Storage REST API
+        # (the SDK upload only accepts bytes or a real file on disk)
+        self.http_client = None
+        if self.client:
+            self.http_client = httpx.Client(
+                base_url=f"{self.supabase_url.rstrip('/')}/storage/v1",
+                headers={
+                    'Authorization': f'Bearer {self.service_role_key}',
+                    'apikey': self.service_role_key
+                },
+                timeout=60.0,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=64)
+            )
     
     def upload_file(
         self,
@@ -98,19 +123,69 @@ class SupabaseStorageService:
             logger.error(f"Error uploading file to Supabase Storage: {e}", exc_info=True)
             return None
     
+    def upload_stream(
+        self,
+        bucket: str,
+        file_path: str,
+        stream: BinaryIO,
+        content_type: str = 'image/png',
+        upsert: bool = True
+    ) -> Optional[str]:
+        """
+        Upload a file-like object to Supabase Storage without reading it in memory.
+        The body is sent in chunks straight from the stream.
+        
+        Args:
+            bucket: Name of the storage bucket
+            file_path: Path/filename in the bucket (e.g., '12_barolo_ab12cd34.jpg')
+            stream: Binary file-like object positioned at the start of the content
+            content_type: MIME type of the file
+            upsert: If True, overwrite existing file; if False, fail if exists
+            
+        Returns:
+            Public URL of the file (only reachable if the bucket is public), or None on error
+        """
+        if not self.http_client:
+            logger.error("Supabase client not initialized")
+            return None
+        
+        try:
+            response = self.http_client.post(
+                f"/object/{bucket}/{file_path}",
+                content=stream,
+                headers={
+                    'Content-Type': content_type,
+                    'x-upsert': 'true' if upsert else 'false'
+                }
+            )
+            if response.status_code >= 400:
+                logger.error(f"Upload error for {bucket}/{file_path}: {response.status_code} {response.text}")
+                return None
+            
+            logger.info(f"File uploaded to {bucket}/{file_path}")
+            return self.get_public_url(bucket, file_path)
+            
+        except Exception as e:
+            logger.error(f"Error uploading file to Supabase Storage: {e}", exc_info=True)
+            return None
+    
     def get_signed_url(
         self,
         bucket: str,
         file_path: str,
-        expires_in: int = 3600
+        expires_in: int = 3600,
+        reuse_cached: bool = True
     ) -> Optional[str]:
         """
         Generate a signed URL for a file in a private bucket.
+        A URL signed earlier is reused while it has more than
+        SIGNED_URL_REFRESH_MARGIN seconds left, saving a call to Supabase.
         
         Args:
             bucket: Name of the storage bucket
             file_path: Path/filename in the bucket
             expires_in: URL expiration time in seconds (default: 1 hour)
+            reuse_cached: If False, always sign a new URL (e.g. after the file changed)
             
         Returns:
             Signed URL string or None if error
@@ -119,6 +194,21 @@ class SupabaseStorageService:
             logger.error("Supabase client not initialized")
             return None
         
+        cache_key = (bucket, file_path, expires_in)
+        if reuse_cached:
+            cached = self._signed_urls.get(cache_key)
+            if cached and cached[0] - time.monotonic() > SIGNED_URL_REFRESH_MARGIN:
+                return cached[1]
+        
+        signed_at = time.monotonic()
+        signed_url = self._create_signed_url(bucket, file_path, expires_in)
+        if signed_url:
+            with self._signed_urls_lock:
+                self._signed_urls[cache_key] = (signed_at + expires_in, signed_url)
+        return signed_url
+    
+    def _create_signed_url(self, bucket: str, file_path: str, expires_in: int) -> Optional[str]:
+        """Sign a new URL for a file in a private bucket (network call to Supabase)."""
         try:
             # create_signed_url returns dict with 'signedUrl' or 'signedURL' and 'error'
             response = self.client.storage.from_(bucket).create_signed_url(
@@ -235,3 +325,8 @@ class SupabaseStorageService:
             logger.debug(f"Error checking file existence: {e}")
             return False
 
+
+@process_singleton
+def get_storage_service() -> SupabaseStorageService:
+    """Get the process-wide SupabaseStorageService (first call needs an application context)."""
+    return SupabaseStorageService()
@@ -2,7 +2,11 @@
 Vector Search Service using Qdrant for LIBER
 Handles semantic search for wine recommendations
 """
+import hashlib
+import time
 import uuid
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Optional
 from datetime import datetime
 from flask import current_app
@@ -10,6 +14,54 @@ from openai import OpenAI
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.models import Distance, VectorParams, PointStruct
+from app.utils.singleton import process_singleton
+
+# int8 scalar quantization: 4x smaller vectors kept in RAM, recall preserved by
+# rescoring an oversampled candidate set with the original vectors
+_QUANTIZATION_CONFIG = models.ScalarQuantization(
+    scalar=models.ScalarQuantizationConfig(
+        type=models.ScalarType.INT8,
+        quantile=0.99,
+        always_ram=True
+    )
+)
+_SEARCH_PARAMS = models.SearchParams(
+    quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+# Search query embeddings (LRU). An embedding only depends on model and text,
+# so entries never go stale; each gunicorn worker keeps its own copy.
+_QUERY_EMBEDDING_CACHE_MAX_ENTRIES = 2048
+_query_embedding_cache = OrderedDict()
+_query_embedding_cache_lock = threading.Lock()
+
+# Circuit breaker for search(): after _SEARCH_FAILURE_THRESHOLD consecutive failures
+# search() fails fast for _SEARCH_COOLDOWN_SECONDS, instead of waiting on a
+# failing embeddings API or Qdrant on every chat turn
+_SEARCH_FAILURE_THRESHOLD = 3
+_SEARCH_COOLDOWN_SECONDS = 60
+_search_breaker = {'failures': 0, 'open_until': 0.0}
+_search_breaker_lock = threading.Lock()
+
+
+def _search_breaker_open() -> bool:
+    with _search_breaker_lock:
+        return time.monotonic() < _search_breaker['open_until']
+
+
+def _record_search_result(ok: bool) -> None:
+    with _search_breaker_lock:
+        if ok:
+            _search_breaker['failures'] = 0
+            return
+        _search_breaker['failures'] += 1
+        if _search_breaker['failures'] >= _SEARCH_FAILURE_THRESHOLD:
+            _search_breaker['failures'] = 0
+            _search_breaker['open_until'] = time.monotonic() + _SEARCH_COOLDOWN_SECONDS
+
+
+class VectorSearchUnavailableError(RuntimeError):
+    """Raised by search() when Qdrant is unavailable or the search fails."""
 
 
 class VectorSearchService:
@@ -25,8 +77,13 @@ class VectorSearchService:
         self.embedding_model = current_app.config.get('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
         self.embedding_dimensions = 1536  # text-embedding-3-small dimensions
         
-        # Initialize clients
-        self.openai_client = OpenAI(api_key=current_app.config.get('OPENAI_API_KEY'))
+        # Initialize clients. Embedding calls are small: fail fast instead of
+        # the SDK's 10 minute default timeout
+        self.openai_client = OpenAI(
+            api_key=current_app.config.get('OPENAI_API_KEY'),
+            timeout=10.0,
+            max_retries=1
+        )
         
         try:
             self.qdrant_client = QdrantClient(
@@ -39,7 +96,12 @@ class VectorSearchService:
             self.qdrant_client = None
     
     def _ensure_collection_exists(self):
-        """Create the collection if it doesn't exist."""
+        """
+        Create the collection if it doesn't exist, with int8 quantization and a
+        payload index on venue_id (every search filters by venue).
+        Collections created before quantization are upgraded in place; a failed
+        upgrade or index step is logged and the client stays usable.
+        """
         if not self.qdrant_client:
             return
             
@@ -52,9 +114,34 @@ class VectorSearchService:
                 vectors_config=VectorParams(
                     size=self.embedding_dimensions,
                     distance=Distance.COSINE
-                )
+                ),
+                quantization_config=_QUANTIZATION_CONFIG
             )
             print(f"Created Qdrant collection: {self.collection_name}")
+            payload_schema = {}
+        else:
+            try:
+                info = self.qdrant_client.get_collection(self.collection_name)
+                payload_schema = info.payload_schema or {}
+                if info.config.quantization_config is None:
+                    self.qdrant_client.update_collection(
+                        collection_name=self.collection_name,
+                        quantization_config=_QUANTIZATION_CONFIG
+                    )
+                    print(f"Enabled int8 quantization on Qdrant collection: {self.collection_name}")
+            except Exception as e:
+                print(f"Warning: Could not upgrade Qdrant collection {self.collection_name}: {e}")
+                return
+        
+        if 'venue_id' not in payload_schema:
+            try:
+                self.qdrant_client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name='venue_id',
+                    field_schema=models.PayloadSchemaType.INTEGER
+                )
+            except Exception as e:
+                print(f"Warning: Could not create venue_id payload index: {e}")
     
     def _get_embedding(self, text: str) -> List[float]:
         """Generate embedding for a text using OpenAI."""
@@ -69,6 +156,31 @@ class VectorSearchService:
             # Return zero vector as fallback
             return [0.0] * self.embedding_dimensions
     
+    def _get_query_embedding(self, query: str) -> List[float]:
+        """
+        Embedding of a search query, cached per process.
+        
+        Chat turns keep searching with the same dish/preference queries; a cache
+        hit skips the embeddings API round trip.
+        """
+        text = ' '.join(query.split())
+        key = hashlib.sha256(f"{self.embedding_model}|{text}".encode('utf-8')).hexdigest()
+        
+        with _query_embedding_cache_lock:
+            embedding = _query_embedding_cache.get(key)
+            if embedding is not None:
+                _query_embedding_cache.move_to_end(key)
+                return embedding
+        
+        embedding = self._get_embedding(text)
+        # Don't keep the zero vector returned when the API call failed
+        if any(embedding):
+            with _query_embedding_cache_lock:
+                _query_embedding_cache[key] = embedding
+                if len(_query_embedding_cache) > _QUERY_EMBEDDING_CACHE_MAX_ENTRIES:
+                    _query_embedding_cache.popitem(last=False)
+        return embedding
+    
     def index_product(self, product) -> bool:
         """
         Index a product in the vector database.
@@ -156,6 +268,38 @@ class VectorSearchService:
             print(f"Error deleting product {product.id}: {e}")
             return False
     
+    def delete_products_bulk(self, product_ids: List[int]) -> bool:
+        """
+        Remove several products from the vector database in a single call.
+        
+        Args:
+            product_ids: IDs of the deleted products
+            
+        Returns:
+            bool: Success status
+        """
+        if not self.qdrant_client or not product_ids:
+            return False
+        
+        try:
+            self.qdrant_client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.FilterSelector(
+                    filter=models.Filter(
+                        must=[
+                            models.FieldCondition(
+                                key="product_id",
+                                match=models.MatchAny(any=list(product_ids))
+                            )
+                        ]
+                    )
+                )
+            )
+            return True
+        except Exception as e:
+            print(f"Error bulk deleting products: {e}")
+            return False
+    
     def bulk_index(self, products: List) -> int:
         """
         Bulk index multiple products.
@@ -243,14 +387,20 @@ class VectorSearchService:
             
         Returns:
             List of wine dictionaries with scores
+            
+        Raises:
+            VectorSearchUnavailableError: Qdrant is not available, the breaker is
+                open or the search failed; callers fall back to the catalog
         """
-        if not self.qdrant_client:
-            # Fallback to database search if Qdrant is not available
-            return self._fallback_search(query, venue_id, limit)
+        if not self.qdrant_client or _search_breaker_open():
+            raise VectorSearchUnavailableError("Qdrant search unavailable")
         
         try:
             # Get query embedding
-            query_embedding = self._get_embedding(query)
+            query_embedding = self._get_query_embedding(query)
+            if not any(query_embedding):
+                # Zero vector: the embeddings call failed, scores would be meaningless
+                raise RuntimeError("query embedding unavailable")
             
             # Build filter conditions
             must_conditions = [
@@ -297,9 +447,12 @@ class VectorSearchService:
                 collection_name=self.collection_name,
                 query_vector=query_embedding,
                 query_filter=models.Filter(must=must_conditions),
+                search_params=_SEARCH_PARAMS,
                 limit=limit
             )
             
+            _record_search_result(True)
+            
             # Transform results
             wines = []
             for hit in results:
@@ -312,42 +465,8 @@ class VectorSearchService:
             
         except Exception as e:
             print(f"Search error: {e}")
-            return self._fallback_search(query, venue_id, limit)
-    
-    def _fallback_search(
-        self, 
-        query: str, 
-        venue_id: int, 
-        limit: int
-    ) -> List[Dict]:
-        """Fallback to database search when Qdrant is unavailable."""
-        from app.models import Product
-        
-        # Simple keyword-based search
-        query_lower = query.lower()
-        
-        products = Product.query.filter_by(
-            venue_id=venue_id,
-            is_available=True
-        ).all()
-        
-        # Score products based on keyword matching
-        scored = []
-        for p in products:
-            score = 0
-            text = f"{p.name} {p.type} {p.region} {p.grape_variety} {p.description or ''}".lower()
-            
-            for word in query_lower.split():
-                if word in text:
-                    score += 1
-            
-            if score > 0:
-                scored.append((p, score))
-        
-        # Sort by score and return top results
-        scored.sort(key=lambda x: x[1], reverse=True)
-        
-        return [p.to_dict() for p, _ in scored[:limit]]
+            _record_search_result(False)
+            raise VectorSearchUnavailableError(str(e)) from e
     
     def find_similar(
         self, 
@@ -410,6 +529,7 @@ class VectorSearchService:
                         )
                     ]
                 ),
+                search_params=_SEARCH_PARAMS,
                 limit=limit
             )
             
@@ -426,3 +546,8 @@ class VectorSearchService:
             print(f"Similarity search error: {e}")
             return []
 
+
+@process_singleton
+def get_vector_service() -> VectorSearchService:
+    """Get the process-wide VectorSearchService (first call needs an application context)."""
+    return VectorSearchService()
@@ -4,6 +4,7 @@ Uses fine-tuned GPT model to generate professional wine descriptions
 """
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, List
 from openai import OpenAI, APIError, RateLimitError
 from flask import current_app
@@ -11,6 +12,9 @@ from app.services.fine_tuned_selector import FineTunedWineSelector
 
 logger = logging.getLogger(__name__)
 
+# Max concurrent OpenAI calls when generating descriptions for a batch of wines
+DESCRIPTION_BATCH_CONCURRENCY = 8
+
 
 class WineDescriptionGenerator:
     """
@@ -201,45 +205,55 @@ Rispondi in formato JSON:"""
         Returns:
             List of wines with 'description' and structured data fields added
         """
-        results = []
+        if not wines:
+            return []
         
-        for idx, wine in enumerate(wines, 1):
-            try:
-                result = self.generate_description(
-                    wine_name=wine.get('name', ''),
-                    wine_type=wine.get('type', 'red'),
-                    region=wine.get('region'),
-                    grape_variety=wine.get('grape_variety'),
-                    vintage=wine.get('vintage'),
-                    producer=wine.get('producer'),
-                    price=wine.get('price')
-                )
-                
-                # result is now a dict with description and structured data
-                wine_with_data = wine.copy()
-                wine_with_data['description'] = result.get('description', '')
-                wine_with_data['color'] = result.get('color')
-                wine_with_data['aromas'] = result.get('aromas')
-                wine_with_data['body'] = result.get('body')
-                wine_with_data['acidity_level'] = result.get('acidity_level')
-                wine_with_data['tannin_level'] = result.get('tannin_level')
-                wine_with_data['description_status'] = 'completed'
-                results.append(wine_with_data)
-                
-                logger.info(f"Generated description {idx}/{len(wines)}: {wine.get('name')}")
-                
-            except Exception as e:
-                logger.error(f"Error generating description for wine {wine.get('name')}: {e}")
-                wine_with_error = wine.copy()
-                wine_with_error['description'] = None
-                wine_with_error['color'] = None
-                wine_with_error['aromas'] = None
-                wine_with_error['body'] = None
-                wine_with_error['acidity_level'] = None
-                wine_with_error['tannin_level'] = None
-                wine_with_error['description_status'] = 'error'
-                wine_with_error['description_error'] = str(e)
-                results.append(wine_with_error)
-        
-        return results
-
+        # Each description is an independent, network-bound API call: overlap them
+        # with a bounded pool (which also caps concurrent requests to OpenAI).
+        # map() keeps results in the input order.
+        total = len(wines)
+        max_workers = min(DESCRIPTION_BATCH_CONCURRENCY, total)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda item: self._describe_wine(item[0], total, item[1]),
+                enumerate(wines, 1)
+            ))
+    
+    def _describe_wine(self, idx: int, total: int, wine: Dict) -> Dict:
+        """Generate description and structured data for one wine of a batch."""
+        try:
+            result = self.generate_description(
+                wine_name=wine.get('name', ''),
+                wine_type=wine.get('type', 'red'),
+                region=wine.get('region'),
+                grape_variety=wine.get('grape_variety'),
+                vintage=wine.get('vintage'),
+                producer=wine.get('producer'),
+                price=wine.get('price')
+            )
+            
+            # result is now a dict with description and structured data
+            wine_with_data = wine.copy()
+            wine_with_data['description'] = result.get('description', '')
+            wine_with_data['color'] = result.get('color')
+            wine_with_data['aromas'] = result.get('aromas')
+            wine_with_data['body'] = result.get('body')
+            wine_with_data['acidity_level'] = result.get('acidity_level')
+            wine_with_data['tannin_level'] = result.get('tannin_level')
+            wine_with_data['description_status'] = 'completed'
+            
+            logger.info(f"Generated description {idx}/{total}: {wine.get('name')}")
+            return wine_with_data
+            
+        except Exception as e:
+            logger.error(f"Error generating description for wine {wine.get('name')}: {e}")
+            wine_with_error = wine.copy()
+            wine_with_error['description'] = None
+            wine_with_error['color'] = None
+            wine_with_error['aromas'] = None
+            wine_with_error['body'] = None
+            wine_with_error['acidity_level'] = None
+            wine_with_error['tannin_level'] = None
+            wine_with_error['description_status'] = 'error'
+            wine_with_error['description_error'] = str(e)
+            return wine_with_error
@@ -0,0 +1,30 @@
+"""
+Process-wide service instances
+"""
+import functools
+import threading
+
+
+def process_singleton(factory):
+    """
+    Decorator for zero-argument service getters: the factory runs once per
+    process, on first call, and every thread then gets the same instance.
+    
+    Like functools.lru_cache(maxsize=1), but the first call holds a lock so
+    concurrent requests on a fresh worker can't build the service twice.
+    """
+    cached = functools.lru_cache(maxsize=1)(factory)
+    lock = threading.Lock()
+    built = False
+    
+    @functools.wraps(factory)
+    def getter():
+        nonlocal built
+        if not built:
+            with lock:
+                instance = cached()
+                built = True
+                return instance
+        return cached()
+    
+    return getter
@@ -0,0 +1,13 @@
+-- ===========================================
+-- Composite indexes for venue catalog queries
+-- ===========================================
+
+-- Catalog listing filters by venue_id and orders by (type, name):
+-- this index serves both the filter and the ORDER BY without a sort step
+CREATE INDEX IF NOT EXISTS idx_products_venue_type_name
+ON products(venue_id, type, name);
+
+-- Most catalog reads only need available wines
+CREATE INDEX IF NOT EXISTS idx_products_venue_available
+ON products(venue_id, is_available)
+WHERE is_available = TRUE;
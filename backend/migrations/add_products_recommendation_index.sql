@@ -0,0 +1,26 @@
+-- ===========================================
+-- Covering index for the recommendation catalog
+-- ===========================================
+
+-- Recommendation turns read a venue's available wines, optionally filtered by
+-- type and max price, ordered by (type, name). Keys serve the filter and the
+-- ORDER BY without a sort step; INCLUDE carries the remaining selected columns
+-- so the query can be answered with an index-only scan.
+-- is_available is not selected (the predicate pins it to TRUE), so every column
+-- read is a key or INCLUDE column.
+-- Check with EXPLAIN (ANALYZE, BUFFERS) for both the all-types and the
+-- type-filtered query: the plan should be an Index Only Scan with few
+-- "Heap Fetches" (run VACUUM products first so the visibility map is set).
+CREATE INDEX IF NOT EXISTS idx_products_venue_available_type_name
+ON products(venue_id, type, name)
+INCLUDE (id, price, image_url)
+WHERE is_available = TRUE;
+
+-- Superseded indexes, dropped so product writes maintain fewer overlapping ones:
+-- idx_products_venue_available: same leading column and predicate as the index
+-- above, which serves every available-only venue read.
+-- idx_products_venue_type: prefix of idx_products_venue_type_name.
+-- idx_products_venue_id stays: it is the small index for venue-wide reads and
+-- the venue foreign key (including unavailable wines).
+DROP INDEX IF EXISTS idx_products_venue_available;
+DROP INDEX IF EXISTS idx_products_venue_type;
@@ -225,7 +225,8 @@ CREATE INDEX IF NOT EXISTS idx_products_region ON products(region);
 CREATE INDEX IF NOT EXISTS idx_products_is_available ON products(is_available);
 CREATE INDEX IF NOT EXISTS idx_products_price ON products(price);
 CREATE INDEX IF NOT EXISTS idx_products_qdrant_id ON products(qdrant_id);
-CREATE INDEX IF NOT EXISTS idx_products_venue_type ON products(venue_id, type);
+CREATE INDEX IF NOT EXISTS idx_products_venue_type_name ON products(venue_id, type, name);
+CREATE INDEX IF NOT EXISTS idx_products_venue_available_type_name ON products(venue_id, type, name) INCLUDE (id, price, image_url) WHERE is_available = TRUE;
 
 -- ===========================================
 -- SESSIONS TABLE
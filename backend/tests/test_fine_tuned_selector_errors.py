@@ -0,0 +1,55 @@
+"""
+Tests for how FineTunedWineSelector reports an unreachable model endpoint
+"""
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from app.services.fine_tuned_selector import AIServiceUnavailableError, FineTunedWineSelector
+
+
+WINES = [{'id': 1, 'name': 'Barolo Riserva', 'type': 'red', 'price': 60.0}]
+
+
+class DownCompletions:
+    """Chat completions endpoint that can't be reached."""
+
+    def create(self, **kwargs):
+        raise APIConnectionError(request=httpx.Request('POST', 'http://selector.local/v1/chat/completions'))
+
+
+class DownClient:
+    def __init__(self):
+        self.chat = type('Chat', (), {'completions': DownCompletions()})()
+
+
+def _selector(dedicated_endpoint):
+    selector = FineTunedWineSelector.__new__(FineTunedWineSelector)
+    selector.client = DownClient()
+    selector.model = 'ft:test'
+    selector.dedicated_endpoint = dedicated_endpoint
+    return selector
+
+
+def _select(selector):
+    return selector.select_wines(
+        venue_name='Trattoria',
+        venue_id=1,
+        context={'dishes': [{'name': 'Brasato'}]},
+        gathered_info={'journey_preference': 'single'},
+        all_wines=WINES,
+        history=[],
+        user_message='Cosa mi consigli?'
+    )
+
+
+def test_dedicated_endpoint_down_allows_legacy_fallback():
+    with pytest.raises(ValueError) as excinfo:
+        _select(_selector(dedicated_endpoint=True))
+
+    assert not isinstance(excinfo.value, AIServiceUnavailableError)
+
+
+def test_shared_openai_endpoint_down_is_reported():
+    with pytest.raises(AIServiceUnavailableError):
+        _select(_selector(dedicated_endpoint=False))
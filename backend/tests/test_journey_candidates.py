@@ -0,0 +1,67 @@
+"""
+Tests for the journey-mode candidate shortlist (AIAgentService._journey_candidates)
+"""
+import pytest
+from flask import Flask
+
+from app.services.ai_agent import AIAgentService
+from app.services.vector_search import VectorSearchUnavailableError
+
+
+ALL_WINES = [{'id': i, 'name': f'Vino {i}', 'price': 20 + i} for i in range(1, 7)]
+CONTEXT = {'dishes': [{'name': 'Risotto ai funghi'}]}
+
+
+class FakeVectorService:
+    """Stands in for VectorSearchService: returns fixed hits or raises."""
+
+    def __init__(self, results=None, error=None):
+        self.qdrant_client = object()
+        self.results = results or []
+        self.error = error
+        self.calls = []
+
+    def search(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        return self.results
+
+
+@pytest.fixture
+def app_context():
+    app = Flask(__name__)
+    app.config['B2C_JOURNEY_CANDIDATES'] = 3
+    with app.app_context():
+        yield
+
+
+def _agent(vector_service):
+    agent = AIAgentService.__new__(AIAgentService)
+    agent.vector_service = vector_service
+    return agent
+
+
+def test_shortlists_search_hits_in_catalog_order(app_context):
+    service = FakeVectorService(results=[{'id': 5}, {'id': 99}, {'id': 2}, {'id': 4}])
+
+    candidates = _agent(service)._journey_candidates(1, ALL_WINES, CONTEXT, [], None)
+
+    assert [wine['id'] for wine in candidates] == [2, 4, 5]
+
+
+def test_search_unavailable_returns_full_catalog(app_context):
+    service = FakeVectorService(error=VectorSearchUnavailableError("Qdrant search unavailable"))
+
+    candidates = _agent(service)._journey_candidates(1, ALL_WINES, CONTEXT, [], 30.0)
+
+    assert candidates is ALL_WINES
+    assert service.calls[0]['max_price'] == pytest.approx(34.5)
+
+
+def test_too_few_matches_returns_full_catalog(app_context):
+    service = FakeVectorService(results=[{'id': 3}])
+
+    candidates = _agent(service)._journey_candidates(1, ALL_WINES, CONTEXT, [], None)
+
+    assert candidates is ALL_WINES
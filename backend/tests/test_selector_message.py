@@ -0,0 +1,26 @@
+"""
+Tests for the check on selector-written B2C messages (single-call recommendations)
+"""
+from app.services.ai_agent import _message_names_best_wine
+
+
+WINES = [
+    {'id': 1, 'name': 'Barolo Riserva', 'rank': 1, 'best': True},
+    {'id': 2, 'name': 'Langhe Nebbiolo', 'rank': 2, 'best': False},
+]
+
+
+def test_accepts_message_naming_the_best_wine():
+    message = "Con il brasato le consiglio il barolo riserva, oppure un Langhe Nebbiolo."
+
+    assert _message_names_best_wine(message, WINES)
+
+
+def test_rejects_message_about_a_dropped_wine():
+    message = "Le consiglio il Brunello di Montalcino, perfetto con il brasato."
+
+    assert not _message_names_best_wine(message, WINES)
+
+
+def test_rejects_when_no_wines_survived_validation():
+    assert not _message_names_best_wine("Le consiglio il Barolo Riserva.", [])
@@ -0,0 +1,29 @@
+"""
+Tests for the QR code storage path handling in the venue routes (_extract_qr_filename)
+"""
+import pytest
+
+from app.routes.venues import _extract_qr_filename
+
+
+def _legacy_extract(storage_path, bucket):
+    """The split-based extraction _extract_qr_filename replaced."""
+    if '/' in storage_path:
+        return storage_path.split('/', 1)[1] if storage_path.startswith(f"{bucket}/") else storage_path
+    return storage_path
+
+
+@pytest.mark.parametrize('storage_path, expected', [
+    # Current format: bucket-prefixed storage path
+    ('qrcodes/qr_trattoria-da-mario.png', 'qr_trattoria-da-mario.png'),
+    # Bare file name
+    ('qr_trattoria-da-mario.png', 'qr_trattoria-da-mario.png'),
+    # Legacy full URL: not bucket-prefixed, passed through unchanged
+    (
+        'https://example.supabase.co/storage/v1/object/public/qrcodes/qr_trattoria-da-mario.png',
+        'https://example.supabase.co/storage/v1/object/public/qrcodes/qr_trattoria-da-mario.png',
+    ),
+])
+def test_extract_qr_filename(storage_path, expected):
+    assert _extract_qr_filename(storage_path, 'qrcodes') == expected
+    assert _extract_qr_filename(storage_path, 'qrcodes') == _legacy_extract(storage_path, 'qrcodes')